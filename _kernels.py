@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled numeric kernels for EchoLearn
+Tight reduction loops compiled with Numba (installed alongside librosa);
+falls back to plain Python when Numba is unavailable
+"""
+
+try:
+    from numba import njit
+except ImportError:  # pragma: no cover - numba ships with librosa
+    def njit(*args, **kwargs):
+        """No-op stand-in for numba.njit"""
+        def decorator(func):
+            return func
+        return decorator
+
+# Trend codes returned by trajectory()
+TREND_STABLE = 0
+TREND_IMPROVING = 1
+TREND_DECLINING = 2
+
+
+@njit(['Tuple((f8, f8, f8, i4))(i1[:])', 'Tuple((f8, f8, f8, i4))(f8[:])'], cache=True)
+def trajectory(scores):
+    """
+    Least-squares trend line over a score series in a single pass
+
+    Args:
+        scores: int8 (history buffer) or float64 array of scores (at least 2 entries)
+
+    Returns:
+        (slope, intercept, r_squared, trend_code)
+    """
+    n = scores.size
+    sx = 0.0
+    sy = 0.0
+    sxy = 0.0
+    sx2 = 0.0
+    sy2 = 0.0
+    for i in range(n):
+        x = float(i)
+        y = float(scores[i])
+        sx += x
+        sy += y
+        sxy += x * y
+        sx2 += x * x
+        sy2 += y * y
+
+    s_xx = sx2 - sx * sx / n
+    s_xy = sxy - sx * sy / n
+    ss_tot = sy2 - sy * sy / n
+
+    slope = s_xy / s_xx
+    intercept = (sy - slope * sx) / n
+
+    # For an OLS fit, ss_res = ss_tot - slope * s_xy
+    r_squared = 0.0
+    if ss_tot != 0.0:
+        r_squared = slope * s_xy / ss_tot
+
+    if slope > 0.1:
+        trend = TREND_IMPROVING
+    elif slope < -0.1:
+        trend = TREND_DECLINING
+    else:
+        trend = TREND_STABLE
+
+    return slope, intercept, r_squared, trend
+
+
+@njit('UniTuple(f8, 2)(f4[:, :], f8[:], f8)', cache=True)
+def spectral_centroid_rolloff(S, freqs, roll_percent):
+    """
+    Mean spectral centroid and rolloff of a magnitude spectrogram in one pass
+
+    Matches librosa.feature.spectral_centroid / spectral_rolloff averaged
+    over frames.
+
+    Args:
+        S: magnitude spectrogram, shape (n_bins, n_frames)
+        freqs: centre frequency of each bin (ascending)
+        roll_percent: energy fraction that defines the rolloff frequency
+
+    Returns:
+        (mean_centroid, mean_rolloff)
+    """
+    n_bins, n_frames = S.shape
+    centroid_sum = 0.0
+    rolloff_sum = 0.0
+    for t in range(n_frames):
+        total = 0.0
+        weighted = 0.0
+        for k in range(n_bins):
+            m = S[k, t]
+            total += m
+            weighted += freqs[k] * m
+        if total > 0.0:
+            centroid_sum += weighted / total
+
+        # Lowest bin whose cumulative magnitude reaches the threshold
+        threshold = roll_percent * total
+        cumulative = 0.0
+        for k in range(n_bins):
+            cumulative += S[k, t]
+            if cumulative >= threshold:
+                rolloff_sum += freqs[k]
+                break
+
+    return centroid_sum / n_frames, rolloff_sum / n_frames
+
+
+@njit('UniTuple(f8, 2)(f8[:], f8[:])', cache=True, fastmath=True)
+def weighted_total(scores, weights):
+    """
+    Weighted sum of scores and the sum of weights in one pass
+
+    Args:
+        scores: per-item scores
+        weights: per-item weights (e.g. questions answered)
+
+    Returns:
+        (sum(scores * weights), sum(weights))
+    """
+    total_weighted = 0.0
+    total_weight = 0.0
+    for i in range(scores.shape[0]):
+        total_weight += weights[i]
+        total_weighted += scores[i] * weights[i]
+    return total_weighted, total_weight
@@ -4,37 +4,152 @@ Adaptive Learning Module for EchoLearn
 Handles intelligent difficulty adjustment based on student performance
 """
 
-import random
+from random import randint
 import logging
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
+import sys
+import time
+from typing import Dict, List, Optional, Set, Tuple, Union
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import MappingProxyType
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+import numpy as np
+
+import _kernels
+
+# Logging is configured by the application, not on import
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Indexed by the trend codes returned from _kernels.trajectory
+_TREND_NAMES = ('stable', 'improving', 'declining')
+
+# dataclass(slots=True) needs Python 3.10+; older interpreters keep a __dict__
+_DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+# Smoothing factors for the fast/slow score moving averages behind the learning trend
+_EMA_FAST_ALPHA = 0.5
+_EMA_SLOW_ALPHA = 0.15
+
+# Text levels to numeric difficulty, for questions without an explicit difficulty
+_LEVEL_TO_DIFF = MappingProxyType({
+    'Basic': 3, 'Easy': 3,
+    'Intermediate': 8, 'Moderate': 8,
+    'Advanced': 13, 'Difficult': 13,
+    'Expert': 18
+})
+
+# Scores and difficulties are kept in int8 history columns
+_INT8_MIN, _INT8_MAX = -128, 127
+
+def _history_value(value, name: str) -> int:
+    """Round a score or difficulty to the int8 history columns, rejecting values they can't hold"""
+    rounded = int(round(value))  # NaN and infinities raise here
+    if not _INT8_MIN <= rounded <= _INT8_MAX:
+        raise ValueError(f"{name} {value!r} is outside the recordable range [{_INT8_MIN}, {_INT8_MAX}]")
+    return rounded
+
+class _HistoryBuffer:
+    """Column-wise (structure-of-arrays) store of per-answer performance records"""
+    
+    __slots__ = ('cap', 'n', 'question_indices', 'scores', 'difficulties', 'correct', 'timestamps')
+    
+    def __init__(self, cap: int = 128) -> None:
+        self.cap = cap
+        self.n = 0
+        self.question_indices = np.empty(cap, dtype=np.int32)
+        self.scores = np.empty(cap, dtype=np.int8)
+        self.difficulties = np.empty(cap, dtype=np.int8)
+        self.correct = np.empty(cap, dtype=np.bool_)
+        self.timestamps = np.empty(cap, dtype=np.int64)
+    
+    def __len__(self) -> int:
+        return self.n
+    
+    def append(self, question_index: int, score: int, difficulty: int, correct: bool, timestamp: int) -> None:
+        """Append one record, doubling capacity when the buffer is full"""
+        if self.n == self.cap:
+            self._grow()
+        
+        i = self.n
+        self.question_indices[i] = question_index
+        self.scores[i] = score
+        self.difficulties[i] = difficulty
+        self.correct[i] = correct
+        self.timestamps[i] = timestamp
+        self.n = i + 1
+    
+    def recent_scores(self, k: int) -> np.ndarray:
+        """View of the last k scores (fewer if less history); O(1), no copy"""
+        return self.scores[max(0, self.n - k):self.n]
+    
+    def _grow(self) -> None:
+        """Geometric growth keeps appends amortized O(1)"""
+        self.cap *= 2
+        self.question_indices = np.resize(self.question_indices, self.cap)
+        self.scores = np.resize(self.scores, self.cap)
+        self.difficulties = np.resize(self.difficulties, self.cap)
+        self.correct = np.resize(self.correct, self.cap)
+        self.timestamps = np.resize(self.timestamps, self.cap)
+    
+    def records(self) -> List[Dict]:
+        """Materialize the filled part of the buffer as a list of record dicts"""
+        n = self.n
+        return [
+            {
+                'question_index': qi,
+                'score': score,
+                'difficulty': diff,
+                'correct': correct,
+                'timestamp': datetime.fromtimestamp(ts / 1e9).isoformat()
+            }
+            for qi, score, diff, correct, ts in zip(
+                self.question_indices[:n].tolist(),
+                self.scores[:n].tolist(),
+                self.difficulties[:n].tolist(),
+                self.correct[:n].tolist(),
+                self.timestamps[:n].tolist()
+            )
+        ]
+
+HistoryLike = Union[_HistoryBuffer, List[Dict]]
+
+def _history_columns(history: HistoryLike) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return (scores, difficulties, correct) arrays for a buffer or a list of record dicts"""
+    if isinstance(history, _HistoryBuffer):
+        n = history.n
+        return history.scores[:n], history.difficulties[:n], history.correct[:n]
+    
+    # Values are taken as given: integer records give int64 columns, any fractional
+    # value makes that column float64 (only the int8 buffer rounds, in update_state)
+    scores = np.array([p['score'] for p in history])
+    difficulties = np.array([p['difficulty'] for p in history])
+    correct = np.array([p['correct'] for p in history], dtype=np.bool_)
+    return scores, difficulties, correct
+
+@dataclass(**_DATACLASS_SLOTS)
 class AdaptiveState:
     """Represents the current state of adaptive learning"""
     current_difficulty: int = 10
     consecutive_wrong_same_level: int = 0
     last_answer_correct: Optional[bool] = None
-    difficulty_path: List[Dict] = None
-    performance_history: List[Dict] = None
+    buf: _HistoryBuffer = field(default_factory=_HistoryBuffer)
+    correct_count: int = 0
+    score_sum: int = 0
+    ema_fast: float = 0.0
+    ema_slow: float = 0.0
     
-    def __post_init__(self):
-        if self.difficulty_path is None:
-            self.difficulty_path = []
-        if self.performance_history is None:
-            self.performance_history = []
+    @property
+    def performance_history(self) -> List[Dict]:
+        """Per-answer records built on demand from the history buffer"""
+        return self.buf.records()
 
 class AdaptiveLearningEngine:
     """Implements adaptive learning algorithm based on performance"""
     
-    def __init__(self):
+    def __init__(self) -> None:
         self.state = AdaptiveState()
-        self.difficulty_bounds = (1, 20)  # Min and max difficulty levels
-        self.correct_threshold = 6  # Score >= 6 considered correct
+        self.difficulty_bounds: Tuple[int, int] = (1, 20)  # Min and max difficulty levels
+        self.correct_threshold: int = 6  # Score >= 6 considered correct
     
     def update_state(self, score: int, question_index: int, question_difficulty: int) -> Dict:
         """
@@ -48,20 +163,23 @@ class AdaptiveLearningEngine:
         Returns:
             Dict with updated state and recommendations
         """
+        # History columns are int8: round explicitly and fail loudly rather than truncate or wrap
+        # (correctness and the running aggregates still use the exact score)
+        recorded_score = _history_value(score, 'score')
+        recorded_difficulty = _history_value(question_difficulty, 'question_difficulty')
+        
         is_correct = score >= self.correct_threshold
         self.state.last_answer_correct = is_correct
         
         # Record performance
-        performance_record = {
-            'question_index': question_index,
-            'score': score,
-            'difficulty': question_difficulty,
-            'correct': is_correct,
-            'timestamp': self._get_timestamp()
-        }
-        
-        self.state.performance_history.append(performance_record)
-        self.state.difficulty_path.append(performance_record)
+        self.state.buf.append(question_index, recorded_score, recorded_difficulty, is_correct, self._get_timestamp())
+        self.state.correct_count += int(is_correct)
+        self.state.score_sum += score
+        if self.state.buf.n == 1:
+            self.state.ema_fast = self.state.ema_slow = float(score)
+        else:
+            self.state.ema_fast += _EMA_FAST_ALPHA * (score - self.state.ema_fast)
+            self.state.ema_slow += _EMA_SLOW_ALPHA * (score - self.state.ema_slow)
         
         # Update adaptive logic
         if is_correct:
@@ -76,73 +194,64 @@ class AdaptiveLearningEngine:
         self.state.consecutive_wrong_same_level = 0
         
         # Move to random question from higher difficulty
-        higher_difficulties = [d for d in range(self.state.current_difficulty + 1, self.difficulty_bounds[1] + 1)]
-        if higher_difficulties:
-            self.state.current_difficulty = random.choice(higher_difficulties)
-            logger.info(f"Correct answer: Increased difficulty to {self.state.current_difficulty}")
+        current = self.state.current_difficulty
+        highest = self.difficulty_bounds[1]
+        if current < highest:
+            self.state.current_difficulty = randint(current + 1, highest)
+            logger.info("Correct answer: Increased difficulty to %d", self.state.current_difficulty)
     
     def _handle_incorrect_answer(self) -> None:
         """Handle logic when student answers incorrectly"""
-        self.state.consecutive_wrong_same_level += 1
-        
-        if self.state.consecutive_wrong_same_level >= 2:
-            # Two consecutive wrong answers at same level -> drop down difficulty
-            if self.state.current_difficulty > self.difficulty_bounds[0]:
-                self.state.current_difficulty = max(self.difficulty_bounds[0], self.state.current_difficulty - 2)
-                logger.info(f"Two consecutive wrong: Decreased difficulty to {self.state.current_difficulty}")
-            self.state.consecutive_wrong_same_level = 0
-        else:
-            logger.info(f"Wrong answer: Staying at difficulty {self.state.current_difficulty}")
+        state = self.state
+        state.consecutive_wrong_same_level += 1
+        
+        # Common case: first wrong answer at this level -> stay
+        if state.consecutive_wrong_same_level < 2:
+            logger.info("Wrong answer: Staying at difficulty %d", state.current_difficulty)
+            return
+        
+        # Two consecutive wrong answers at same level -> drop down difficulty
+        current = state.current_difficulty
+        lowest = self.difficulty_bounds[0]
+        if current > lowest:
+            state.current_difficulty = current - 2 if current - 2 > lowest else lowest
+            logger.info("Two consecutive wrong: Decreased difficulty to %d", state.current_difficulty)
+        state.consecutive_wrong_same_level = 0
     
     def _get_recommendations(self) -> Dict:
-        """Get recommendations based on current state"""
+        """Get recommendations based on current state (one read of the recent-score window)"""
+        state = self.state
+        
+        # Ready when the last three scores are all >= 8; needs reinforcement when all < 6
+        last3 = state.buf.recent_scores(3).tolist()
+        ready_for_higher = needs_reinforcement = False
+        if len(last3) == 3:
+            ready_for_higher = min(last3) >= 8
+            needs_reinforcement = max(last3) < 6
+        
         return {
-            'target_difficulty': self.state.current_difficulty,
-            'consecutive_wrong': self.state.consecutive_wrong_same_level,
-            'last_correct': self.state.last_answer_correct,
-            'ready_for_higher_difficulty': self._is_ready_for_higher_difficulty(),
-            'needs_reinforcement': self._needs_reinforcement(),
+            'target_difficulty': state.current_difficulty,
+            'consecutive_wrong': state.consecutive_wrong_same_level,
+            'last_correct': state.last_answer_correct,
+            'ready_for_higher_difficulty': ready_for_higher,
+            'needs_reinforcement': needs_reinforcement,
             'learning_trend': self._analyze_learning_trend()
         }
     
-    def _is_ready_for_higher_difficulty(self) -> bool:
-        """Check if student is ready for higher difficulty"""
-        if len(self.state.performance_history) < 3:
-            return False
-        
-        recent_scores = [p['score'] for p in self.state.performance_history[-3:]]
-        return all(score >= 8 for score in recent_scores)
-    
-    def _needs_reinforcement(self) -> bool:
-        """Check if student needs reinforcement at current level"""
-        if len(self.state.performance_history) < 3:
-            return False
-        
-        recent_scores = [p['score'] for p in self.state.performance_history[-3:]]
-        return all(score < 6 for score in recent_scores)
-    
     def _analyze_learning_trend(self) -> str:
-        """Analyze learning trend over recent performance"""
-        if len(self.state.performance_history) < 5:
+        """Analyze learning trend by comparing fast and slow moving averages of the score"""
+        if self.state.buf.n < 5:
             return "insufficient_data"
         
-        recent_scores = [p['score'] for p in self.state.performance_history[-5:]]
-        
-        # Calculate trend
-        if len(recent_scores) >= 3:
-            first_half = sum(recent_scores[:len(recent_scores)//2]) / (len(recent_scores)//2)
-            second_half = sum(recent_scores[len(recent_scores)//2:]) / (len(recent_scores) - len(recent_scores)//2)
-            
-            if second_half > first_half + 1:
-                return "improving"
-            elif second_half < first_half - 1:
-                return "declining"
-            else:
-                return "stable"
-        
-        return "stable"
+        gap = self.state.ema_fast - self.state.ema_slow
+        if gap > 0.5:
+            return "improving"
+        elif gap < -0.5:
+            return "declining"
+        else:
+            return "stable"
     
-    def find_next_question(self, questions: List[Dict], used_indices: List[int]) -> Optional[int]:
+    def find_next_question(self, questions: List[Dict], used_indices: Union[List[int], Set[int]]) -> Optional[int]:
         """
         Find the next question based on adaptive learning algorithm
         
@@ -154,78 +263,88 @@ class AdaptiveLearningEngine:
             Index of recommended next question or None
         """
         target_difficulty = self.state.current_difficulty
+        bucket = self._build_bucket(questions)
+        used = used_indices if isinstance(used_indices, (set, frozenset)) else set(used_indices)
         
-        # First try exact match
-        for i, q in enumerate(questions):
-            if (i not in used_indices and 
-                q.get('difficulty', self._get_difficulty_from_level(q.get('level', 'Basic'))) == target_difficulty):
-                return i
-        
-        # If no exact match, find closest difficulty
+        # Closest difficulty wins (exact match first); ties go to the lowest index
         best_match = None
         best_diff = float('inf')
         
-        for i, q in enumerate(questions):
-            if i not in used_indices:
-                qa_difficulty = q.get('difficulty', self._get_difficulty_from_level(q.get('level', 'Basic')))
-                diff = abs(qa_difficulty - target_difficulty)
-                if diff < best_diff:
-                    best_diff = diff
-                    best_match = i
+        for difficulty, indices in bucket.items():
+            diff = abs(difficulty - target_difficulty)
+            if diff > best_diff:
+                continue
+            
+            candidate = next((i for i in indices if i not in used), None)
+            if candidate is None:
+                continue
+            
+            if diff < best_diff or candidate < best_match:
+                best_diff = diff
+                best_match = candidate
         
         return best_match
     
+    @staticmethod
+    def _build_bucket(questions: List[Dict]) -> Dict[int, List[int]]:
+        """Group question indices by difficulty (rebuilt per call, so edits to the list are always seen)"""
+        bucket: Dict[int, List[int]] = {}
+        for i, q in enumerate(questions):
+            if 'difficulty' in q:
+                difficulty = q['difficulty']
+            else:
+                difficulty = _LEVEL_TO_DIFF.get(q.get('level', 'Basic'), 10)
+            bucket.setdefault(difficulty, []).append(i)
+        return bucket
+    
     def _get_difficulty_from_level(self, level: str) -> int:
         """Convert text levels to numeric difficulty for compatibility"""
-        mapping = {
-            'Basic': 3, 'Easy': 3,
-            'Intermediate': 8, 'Moderate': 8, 
-            'Advanced': 13, 'Difficult': 13,
-            'Expert': 18
-        }
-        return mapping.get(level, 10)
+        return _LEVEL_TO_DIFF.get(level, 10)
     
-    def _get_timestamp(self) -> str:
-        """Get current timestamp"""
-        import time
-        return time.strftime("%Y-%m-%d %H:%M:%S")
+    def _get_timestamp(self) -> int:
+        """Get current timestamp (epoch nanoseconds, formatted on export)"""
+        return time.time_ns()
     
-    def get_learning_analytics(self) -> Dict:
-        """Get comprehensive learning analytics"""
-        if not self.state.performance_history:
+    def get_learning_summary(self) -> Dict:
+        """Get scalar learning metrics from the running aggregates (O(1))"""
+        total_questions = self.state.buf.n
+        if total_questions == 0:
             return {
                 'total_questions': 0,
                 'accuracy_rate': 0,
                 'average_score': 0,
-                'difficulty_progression': [],
-                'learning_trend': 'no_data',
-                'recommendations': []
+                'learning_trend': 'no_data'
             }
         
-        total_questions = len(self.state.performance_history)
-        correct_answers = sum(1 for p in self.state.performance_history if p['correct'])
-        accuracy_rate = (correct_answers / total_questions) * 100
-        average_score = sum(p['score'] for p in self.state.performance_history) / total_questions
-        
-        difficulty_progression = [p['difficulty'] for p in self.state.performance_history]
-        learning_trend = self._analyze_learning_trend()
-        
-        recommendations = self._generate_recommendations()
-        
         return {
             'total_questions': total_questions,
-            'accuracy_rate': accuracy_rate,
-            'average_score': average_score,
-            'difficulty_progression': difficulty_progression,
-            'learning_trend': learning_trend,
-            'recommendations': recommendations
+            'accuracy_rate': (self.state.correct_count / total_questions) * 100,
+            'average_score': self.state.score_sum / total_questions,
+            'learning_trend': self._analyze_learning_trend()
         }
     
-    def _generate_recommendations(self) -> List[str]:
+    def get_difficulty_progression(self) -> List[int]:
+        """Get the difficulty of every answered question, in order"""
+        buf = self.state.buf
+        return buf.difficulties[:buf.n].tolist()
+    
+    def get_learning_analytics(self) -> Dict:
+        """Get comprehensive learning analytics"""
+        summary = self.get_learning_summary()
+        if summary['total_questions'] == 0:
+            summary['difficulty_progression'] = []
+            summary['recommendations'] = []
+            return summary
+        
+        summary['difficulty_progression'] = self.get_difficulty_progression()
+        summary['recommendations'] = self._generate_recommendations(summary)
+        return summary
+    
+    def _generate_recommendations(self, summary: Optional[Dict] = None) -> List[str]:
         """Generate personalized learning recommendations"""
         recommendations = []
         
-        analytics = self.get_learning_analytics()
+        analytics = summary if summary is not None else self.get_learning_summary()
         
         if analytics['accuracy_rate'] >= 80:
             recommendations.append("Excellent performance! You're ready for more challenging questions.")
@@ -249,8 +368,8 @@ class AdaptiveLearningEngine:
         self.state = AdaptiveState()
         logger.info("Adaptive learning state reset")
     
-    def export_learning_data(self) -> Dict:
-        """Export learning data for analysis"""
+    def export_raw(self) -> Dict:
+        """Export state and history only (no analytics), e.g. for persistence"""
         return {
             'state': {
                 'current_difficulty': self.state.current_difficulty,
@@ -258,87 +377,83 @@ class AdaptiveLearningEngine:
                 'last_answer_correct': self.state.last_answer_correct
             },
             'performance_history': self.state.performance_history,
-            'difficulty_path': self.state.difficulty_path,
-            'analytics': self.get_learning_analytics()
+            'difficulty_path': self.get_difficulty_progression()
         }
+    
+    def export_with_analytics(self) -> Dict:
+        """Export state and history together with learning analytics"""
+        data = self.export_raw()
+        data['analytics'] = self.get_learning_analytics()
+        return data
+    
+    def export_learning_data(self) -> Dict:
+        """Export learning data for analysis"""
+        return self.export_with_analytics()
 
 class AdaptiveLearningVisualizer:
     """Handles visualization of adaptive learning progress"""
     
     @staticmethod
-    def create_progress_chart(performance_history: List[Dict]) -> Dict:
+    def create_progress_chart(performance_history: HistoryLike) -> Dict:
         """Create data for progress visualization"""
-        if not performance_history:
+        if not len(performance_history):
             return {'questions': [], 'scores': [], 'difficulties': []}
         
-        questions = list(range(1, len(performance_history) + 1))
-        scores = [p['score'] for p in performance_history]
-        difficulties = [p['difficulty'] for p in performance_history]
+        scores, difficulties, _ = _history_columns(performance_history)
         
         return {
-            'questions': questions,
-            'scores': scores,
-            'difficulties': difficulties
+            'questions': list(range(1, scores.size + 1)),
+            'scores': scores.tolist(),
+            'difficulties': difficulties.tolist()
         }
     
     @staticmethod
-    def create_difficulty_distribution(performance_history: List[Dict]) -> Dict:
+    def create_difficulty_distribution(performance_history: HistoryLike) -> Dict:
         """Create difficulty distribution data"""
-        if not performance_history:
+        if not len(performance_history):
             return {}
         
-        distribution = {}
-        for p in performance_history:
-            diff = p['difficulty']
-            if diff not in distribution:
-                distribution[diff] = {'total': 0, 'correct': 0, 'scores': []}
-            
-            distribution[diff]['total'] += 1
-            if p['correct']:
-                distribution[diff]['correct'] += 1
-            distribution[diff]['scores'].append(p['score'])
+        scores, difficulties, correct = _history_columns(performance_history)
+        
+        # Distinct difficulties (any value, fractional or negative) and each record's slot
+        levels, slots = np.unique(difficulties, return_inverse=True)
+        slots = slots.reshape(-1)
+        
+        # Per-difficulty totals, correct counts and score sums in three passes
+        totals = np.bincount(slots)
+        corrects = np.bincount(slots, weights=correct)
+        sums = np.bincount(slots, weights=scores)
         
-        # Calculate averages
-        for diff in distribution:
-            scores = distribution[diff]['scores']
-            distribution[diff]['average_score'] = sum(scores) / len(scores)
-            distribution[diff]['accuracy'] = (distribution[diff]['correct'] / distribution[diff]['total']) * 100
+        # Scores grouped by difficulty (stable sort keeps answer order)
+        order = np.argsort(slots, kind='stable')
+        grouped = np.split(scores[order], np.cumsum(totals)[:-1])
+        
+        distribution = {}
+        for k, (diff, level_scores) in enumerate(zip(levels.tolist(), grouped)):
+            total = int(totals[k])
+            correct_count = int(corrects[k])
+            distribution[diff] = {
+                'total': total,
+                'correct': correct_count,
+                'scores': level_scores.tolist(),
+                'average_score': float(sums[k]) / total,
+                'accuracy': (correct_count / total) * 100
+            }
         
         return distribution
     
     @staticmethod
-    def create_learning_trajectory(performance_history: List[Dict]) -> Dict:
+    def create_learning_trajectory(performance_history: HistoryLike) -> Dict:
         """Create learning trajectory analysis"""
         if len(performance_history) < 3:
             return {'trend': 'insufficient_data', 'slope': 0, 'r_squared': 0}
         
         # Simple linear regression to find trend
-        x_values = list(range(len(performance_history)))
-        y_values = [p['score'] for p in performance_history]
-        
-        n = len(x_values)
-        sum_x = sum(x_values)
-        sum_y = sum(y_values)
-        sum_xy = sum(x * y for x, y in zip(x_values, y_values))
-        sum_x2 = sum(x * x for x in x_values)
-        
-        # Calculate slope and intercept
-        slope = (n * sum_xy - sum_x * sum_y) / (n * sum_x2 - sum_x * sum_x)
-        intercept = (sum_y - slope * sum_x) / n
-        
-        # Calculate R-squared
-        y_mean = sum_y / n
-        ss_tot = sum((y - y_mean) ** 2 for y in y_values)
-        ss_res = sum((y - (slope * x + intercept)) ** 2 for x, y in zip(x_values, y_values))
-        r_squared = 1 - (ss_res / ss_tot) if ss_tot != 0 else 0
-        
-        # Determine trend
-        if slope > 0.1:
-            trend = 'improving'
-        elif slope < -0.1:
-            trend = 'declining'
-        else:
-            trend = 'stable'
+        scores, _, _ = _history_columns(performance_history)
+        if scores.dtype != np.int8:
+            scores = scores.astype(np.float64)
+        slope, intercept, r_squared, trend_code = _kernels.trajectory(np.ascontiguousarray(scores))
+        trend = _TREND_NAMES[trend_code]
         
         return {
             'trend': trend,
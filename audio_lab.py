@@ -7,8 +7,6 @@ Handles audio recording, processing, and visualization for ML training data
 import streamlit as st
 import numpy as np
 import librosa
-import librosa.display
-import matplotlib.pyplot as plt
 import plotly.graph_objects as go
 import plotly.express as px
 from   plotly.subplots import make_subplots
@@ -17,9 +15,238 @@ import soundfile as sf
 import io
 import os
 import datetime
+import functools
+import logging
 import pandas as pd
+from scipy.fft import rfft, rfftfreq
 from pathlib import Path
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+import _kernels
+
+logger = logging.getLogger(__name__)
+
+# Background writer for recording files, so saving never blocks the UI thread
+_IO_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="audio-io")
+
+def _log_write_failure(future):
+    """Report a failed background write (there is no Streamlit context to show it in)"""
+    if future.exception() is not None:
+        logger.error("Saving recording failed: %s", future.exception())
+
+def _map_wav_samples(path):
+    """Read-only memory map of a 16-bit PCM WAV file's samples (only chunk headers are read)"""
+    with open(path, 'rb') as f:
+        f.seek(12)  # past the RIFF/WAVE header
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path} has no data chunk")
+            size = int.from_bytes(header[4:], 'little')
+            if header[:4] == b'data':
+                return np.memmap(path, dtype='<i2', mode='r', offset=f.tell(), shape=(size // 2,))
+            f.seek(size + (size & 1), os.SEEK_CUR)  # chunks are padded to even sizes
+
+def _settle_saved_recordings(pending):
+    """
+    Point recordings whose background WAV write has finished at a memory map of the file
+    
+    Runs on the script thread (session state isn't safe to change from the I/O pool);
+    recordings still being written stay in the pending list with their in-memory samples.
+    """
+    still_pending = []
+    for recording, path, future in pending:
+        if not future.done():
+            still_pending.append((recording, path, future))
+        elif future.exception() is None:
+            try:
+                recording['audio'] = _map_wav_samples(path)
+            except Exception:
+                logger.exception("Mapping saved recording %s failed", path)
+    pending[:] = still_pending
+
+# STFT / mel settings shared by the feature extractors (librosa defaults)
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+
+@functools.lru_cache(maxsize=8)
+def _cached_mel_basis(sr, n_fft, n_mels):
+    """Mel filter bank, built once per (sr, n_fft, n_mels)"""
+    mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+    mel_basis.setflags(write=False)
+    return mel_basis
+
+@functools.lru_cache(maxsize=8)
+def _cached_window(n_fft):
+    """Periodic Hann analysis window, built once per n_fft"""
+    window = librosa.filters.get_window('hann', n_fft, fftbins=True)
+    window.setflags(write=False)
+    return window
+
+# Recordings per zero-padded STFT batch in the feature export
+EXPORT_BATCH_SIZE = 8
+
+# Upper bound on points handed to a Plotly trace
+MAX_PLOT_POINTS = 4096
+
+def _max_pool(values, max_points=MAX_PLOT_POINTS):
+    """
+    Downsample non-negative values along the first axis to at most max_points block maxima
+    
+    Returns (pooled, stride).
+    """
+    n = values.shape[0]
+    if n <= max_points:
+        return values, 1
+    
+    stride = -(-n // max_points)  # ceil division
+    blocks = -(-n // stride)
+    pad = [(0, blocks * stride - n)] + [(0, 0)] * (values.ndim - 1)
+    padded = np.pad(values, pad)
+    return padded.reshape((blocks, stride) + values.shape[1:]).max(axis=1), stride
+
+# Upper bound on frequency rows in the spectrogram heatmap
+MAX_SPECTROGRAM_BINS = 512
+
+# librosa.amplitude_to_db defaults
+_DB_AMIN = 1e-5
+_DB_TOP = 80.0
+
+# Pixel columns for the waveform min/max envelope (two points per column)
+WAVEFORM_COLUMNS = 2000
+
+def _minmax_envelope(audio_data, columns=WAVEFORM_COLUMNS):
+    """
+    Min/max envelope of a waveform, interleaved as min, max, min, max, ...
+    
+    Returns (values, step): points are evenly spaced, step samples apart
+    (the raw samples with step 1 when they already fit).
+    """
+    n = len(audio_data)
+    if n <= 2 * columns:
+        return audio_data, 1
+    
+    block = n // columns
+    blocks = audio_data[:block * columns].reshape(columns, block)
+    values = np.empty(2 * columns, dtype=audio_data.dtype)
+    values[0::2] = blocks.min(axis=1)
+    values[1::2] = blocks.max(axis=1)
+    return values, block / 2
+
+def _as_float(audio_data):
+    """float32 audio for analysis; int16 PCM is scaled to [-1, 1), float input is never upcast"""
+    if np.issubdtype(audio_data.dtype, np.integer):
+        audio = audio_data.astype(np.float32)
+        audio *= np.float32(1 / 32768)
+        return audio
+    return audio_data.astype(np.float32, copy=False)
+
+# STFT frames computed per block by _blocked_stft
+STFT_BLOCK_FRAMES = 256
+
+def _blocked_stft(y, n_fft=N_FFT, hop=HOP_LENGTH, block_frames=STFT_BLOCK_FRAMES):
+    """
+    Centred STFT computed block_frames at a time into a preallocated complex64 array
+    
+    Same frames as librosa.stft(y, center=True), but librosa's working buffers stay
+    O(block) instead of O(len(y)). Leading axes of y (e.g. a batch) are kept.
+    """
+    y = np.asarray(y, dtype=np.float32)
+    pad = [(0, 0)] * (y.ndim - 1) + [(n_fft // 2, n_fft // 2)]
+    y_padded = np.pad(y, pad)
+    total_frames = 1 + (y_padded.shape[-1] - n_fft) // hop
+    
+    out = np.empty(y.shape[:-1] + (1 + n_fft // 2, total_frames), dtype=np.complex64)
+    block_samples = n_fft + hop * (block_frames - 1)
+    window = _cached_window(n_fft)
+    for frame in range(0, total_frames, block_frames):
+        start = frame * hop
+        block = librosa.stft(
+            y_padded[..., start:start + block_samples],
+            n_fft=n_fft, hop_length=hop, window=window, center=False, dtype=np.complex64
+        )
+        out[..., frame:frame + block.shape[-1]] = block
+    return out
+
+def _magnitude_spectrogram(audio_data):
+    """Magnitude STFT (float32) with the shared settings and cached window"""
+    return np.abs(_blocked_stft(audio_data))
+
+def _spectrogram_db(S):
+    """
+    Display-sized dB spectrogram of a magnitude spectrogram
+    
+    Returns (S_db, stride), stride being the number of frequency rows pooled into one.
+    """
+    # Max-pool frequency rows first (max commutes with the dB mapping)
+    S_pooled, stride = _max_pool(np.asarray(S, dtype=np.float32), MAX_SPECTROGRAM_BINS)
+    
+    # Same as librosa.amplitude_to_db(S, ref=np.max), in place on a float32 buffer
+    ref = max(float(S_pooled.max()), _DB_AMIN)
+    S_db = np.maximum(S_pooled, np.float32(_DB_AMIN))
+    S_db /= np.float32(ref)
+    np.log10(S_db, out=S_db)
+    S_db *= np.float32(20.0)
+    np.maximum(S_db, np.float32(-_DB_TOP), out=S_db)
+    return S_db, stride
+
+def _spectral_features(audio_data, S, sr):
+    """Mean spectral centroid/rolloff (from S) and zero crossing rate/RMS (time domain)"""
+    # Spectral centroid and rolloff share a single STFT and one fused pass over it
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=N_FFT)
+    spectral_centroid, spectral_rolloff = _kernels.spectral_centroid_rolloff(
+        np.asarray(S, dtype=np.float32), freqs, 0.85
+    )
+    
+    # Zero crossing rate (time domain)
+    zcr = librosa.feature.zero_crossing_rate(audio_data)[0]
+    
+    # RMS energy (time domain)
+    rms = librosa.feature.rms(y=audio_data)[0]
+    
+    return {
+        'spectral_centroid': spectral_centroid,
+        'spectral_rolloff': spectral_rolloff,
+        'zcr': np.mean(zcr),
+        'rms': np.mean(rms)
+    }
+
+def _fft_magnitude(audio_data, sr):
+    """Plot-sized FFT magnitude spectrum; returns (freqs, magnitude)"""
+    # Real-input FFT gives the positive frequencies directly (multi-threaded, plan-cached)
+    magnitude = np.abs(rfft(audio_data, workers=-1))
+    freqs = rfftfreq(len(audio_data), 1/sr)
+    
+    # Keep the plotted spectrum to a bounded number of points (peak-preserving)
+    magnitude, stride = _max_pool(magnitude)
+    return freqs[::stride], magnitude
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _compute_analysis(audio_bytes, sr):
+    """
+    Everything display_comprehensive_analysis plots, computed once per recording
+    
+    Keyed on the raw float32 sample bytes, so Streamlit reruns (tab switches,
+    widget changes) reuse the result instead of redoing the STFT/MFCC/FFT.
+    """
+    audio_data = np.frombuffer(audio_bytes, dtype=np.float32)
+    
+    # One STFT (and mel projection) shared by the spectrogram, spectral and MFCC panels
+    S = _magnitude_spectrogram(audio_data)
+    mel = _cached_mel_basis(sr, N_FFT, N_MELS) @ (S ** 2)
+    S_db, freq_stride = _spectrogram_db(S)
+    fft_freqs, fft_mag = _fft_magnitude(audio_data, sr)
+    
+    return {
+        'S_db': S_db,
+        'freq_stride': freq_stride,
+        'mfcc': librosa.feature.mfcc(S=librosa.power_to_db(mel), n_mfcc=13),
+        'features': _spectral_features(audio_data, S, sr),
+        'fft_freqs': fft_freqs,
+        'fft_mag': fft_mag
+    }
 
 class AudioTrainingLab:
     """Audio Training Laboratory for ML model training data collection"""
@@ -27,7 +254,7 @@ class AudioTrainingLab:
     def __init__(self):
         self.sample_rate = 44100
         self.channels = 1
-        self.dtype = 'float32'
+        self.dtype = 'int16'  # native microphone PCM; converted to float32 for analysis
         self.recordings_dir = Path("audio_recordings")
         self.recordings_dir.mkdir(exist_ok=True)
         
@@ -44,6 +271,9 @@ class AudioTrainingLab:
         st.header("🎙️ Audio Training Laboratory")
         st.markdown("**Collect and analyze audio data for machine learning model training**")
         
+        # Recordings saved since the last run switch to their WAV files before anything reads them
+        _settle_saved_recordings(st.session_state.setdefault('audio_lab_pending_saves', []))
+        
         # Create tabs for different functionalities
         tab1, tab2, tab3, tab4 = st.tabs([
             "🎤 Recording Studio", 
@@ -151,7 +381,7 @@ class AudioTrainingLab:
             )
             if uploaded_file is not None:
                 try:
-                    audio_data, sr = librosa.load(uploaded_file, sr=self.sample_rate)
+                    audio_data, sr = librosa.load(uploaded_file, sr=self.sample_rate, dtype=np.float32)
                     st.session_state.analysis_audio = audio_data
                     st.success("✅ Audio file loaded successfully!")
                 except Exception as e:
@@ -170,19 +400,7 @@ class AudioTrainingLab:
             return
         
         # Display recordings in a table
-        recordings_data = []
-        for i, recording in enumerate(st.session_state.audio_lab_recordings):
-            recordings_data.append({
-                'ID': i,
-                'Name': recording['metadata']['name'],
-                'Speaker': recording['metadata']['speaker'],
-                'Type': recording['metadata']['type'],
-                'Duration': f"{len(recording['audio']) / self.sample_rate:.2f}s",
-                'Timestamp': recording['timestamp'],
-                'File Size': f"{len(recording['audio']) * 4 / 1024:.1f} KB"  # float32 = 4 bytes
-            })
-        
-        df = pd.DataFrame(recordings_data)
+        recordings_data, df = self._library_table()
         
         # Selection and controls
         col1, col2, col3 = st.columns([2, 1, 1])
@@ -210,6 +428,34 @@ class AudioTrainingLab:
         if selected_recording is not None:
             self.display_recording_details(selected_recording)
     
+    def _library_table(self):
+        """
+        Library rows and DataFrame, rebuilt only when the recordings list changes length
+        
+        Recordings are append-only, so the cached rows are extended with the new ones.
+        """
+        recordings = st.session_state.audio_lab_recordings
+        cached = st.session_state.get('audio_lab_library_table')
+        if cached is not None and cached[0] == len(recordings):
+            return cached[1], cached[2]
+        
+        rows = cached[1] if cached is not None and cached[0] < len(recordings) else []
+        rows = rows + [
+            {
+                'ID': i,
+                'Name': recording['metadata']['name'],
+                'Speaker': recording['metadata']['speaker'],
+                'Type': recording['metadata']['type'],
+                'Duration': f"{recording['duration_s']:.2f}s",
+                'Timestamp': recording['timestamp'],
+                'File Size': f"{recording['size_kb']:.1f} KB"
+            }
+            for i, recording in enumerate(recordings[len(rows):], start=len(rows))
+        ]
+        df = pd.DataFrame(rows)
+        st.session_state.audio_lab_library_table = (len(recordings), rows, df)
+        return rows, df
+    
     def display_ml_data_export(self):
         """ML data export interface"""
         st.subheader("🔧 ML Data Export")
@@ -263,41 +509,62 @@ class AudioTrainingLab:
         try:
             st.session_state.recording_in_progress = True
             
-            # Record audio
+            # Record audio: the stream callback fills a preallocated buffer
+            total_frames = int(duration * self.sample_rate)
+            buffer = np.empty((total_frames, self.channels), dtype=self.dtype)
+            filled = 0
+            
+            def callback(indata, frames, time_info, status):
+                nonlocal filled
+                take = min(frames, total_frames - filled)
+                buffer[filled:filled + take] = indata[:take]
+                filled += take
+                if filled >= total_frames:
+                    raise sd.CallbackStop()
+            
             with st.spinner(f"Recording for {duration} seconds..."):
-                audio_data = sd.rec(
-                    int(duration * self.sample_rate),
+                progress_bar = st.progress(0)
+                with sd.InputStream(
                     samplerate=self.sample_rate,
                     channels=self.channels,
-                    dtype=self.dtype
-                )
-                
-                # Progress bar
-                progress_bar = st.progress(0)
-                for i in range(duration):
-                    time.sleep(1)
-                    progress_bar.progress((i + 1) / duration)
-                
-                sd.wait()  # Wait until recording is finished
+                    dtype=self.dtype,
+                    blocksize=1024,
+                    callback=callback
+                ) as stream:
+                    # Poll at 20 Hz so the progress bar keeps up with the stream
+                    while stream.active:
+                        time.sleep(0.05)
+                        progress_bar.progress(min(filled / total_frames, 1.0))
+                progress_bar.progress(1.0)
+            
+            audio_data = buffer[:filled]
+            stem = f"{metadata['name']}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
             
-            # Store recording
+            # Held in memory until the background WAV write finishes, then memory-mapped from it
+            audio = audio_data.reshape(-1)
+            
+            # Store recording (with the sizes the library table shows)
             recording = {
-                'audio': audio_data.flatten(),
+                'audio': audio,
                 'sample_rate': self.sample_rate,
                 'metadata': metadata,
-                'timestamp': datetime.datetime.now().isoformat()
+                'timestamp': datetime.datetime.now().isoformat(),
+                'n_samples': len(audio),
+                'duration_s': len(audio) / self.sample_rate,
+                'size_kb': audio.nbytes / 1024
             }
             
             st.session_state.audio_lab_recordings.append(recording)
-            st.session_state.current_recording = audio_data.flatten()
+            st.session_state.current_recording = audio
             st.session_state.recording_in_progress = False
             
             st.success(f"✅ Recording '{metadata['name']}' completed!")
             
-            # Save to file
-            filename = f"{metadata['name']}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
-            filepath = self.recordings_dir / filename
-            sf.write(filepath, audio_data, self.sample_rate)
+            # Save to file in the background (int16 PCM); a later run maps the file into the library entry
+            filepath = self.recordings_dir / f"{stem}.wav"
+            future = _IO_POOL.submit(sf.write, filepath, audio_data, self.sample_rate)
+            future.add_done_callback(_log_write_failure)
+            st.session_state.setdefault('audio_lab_pending_saves', []).append((recording, filepath, future))
             
         except Exception as e:
             st.session_state.recording_in_progress = False
@@ -330,6 +597,9 @@ class AudioTrainingLab:
         """Display comprehensive audio analysis"""
         st.markdown("### 📊 Audio Analysis Results")
         
+        audio_data = _as_float(audio_data)
+        analysis = _compute_analysis(audio_data.tobytes(), self.sample_rate)
+        
         # Basic info
         duration = len(audio_data) / self.sample_rate
         col1, col2, col3, col4 = st.columns(4)
@@ -345,7 +615,7 @@ class AudioTrainingLab:
         
         # Spectrogram
         st.markdown("#### 🎨 Spectrogram")
-        fig_spec = self.create_spectrogram_plot(audio_data)
+        fig_spec = self.create_spectrogram_plot(analysis['S_db'], analysis['freq_stride'])
         st.plotly_chart(fig_spec, use_container_width=True)
         
         # Feature analysis
@@ -353,7 +623,7 @@ class AudioTrainingLab:
         
         with col1:
             st.markdown("#### 📈 Spectral Features")
-            features = self.extract_spectral_features(audio_data)
+            features = analysis['features']
             
             # Display features as metrics
             st.metric("Spectral Centroid (Hz)", f"{features['spectral_centroid']:.1f}")
@@ -363,7 +633,7 @@ class AudioTrainingLab:
         
         with col2:
             st.markdown("#### 🎵 MFCC Features")
-            mfcc = librosa.feature.mfcc(y=audio_data, sr=self.sample_rate, n_mfcc=13)
+            mfcc = analysis['mfcc']
             
             # MFCC heatmap
             fig_mfcc = px.imshow(
@@ -376,17 +646,20 @@ class AudioTrainingLab:
         
         # Frequency analysis
         st.markdown("#### 🔊 Frequency Analysis")
-        fig_fft = self.create_fft_plot(audio_data)
+        fig_fft = self.create_fft_plot(analysis['fft_freqs'], analysis['fft_mag'])
         st.plotly_chart(fig_fft, use_container_width=True)
     
     def create_waveform_plot(self, audio_data):
         """Create waveform visualization"""
-        time_axis = np.linspace(0, len(audio_data) / self.sample_rate, len(audio_data))
+        # Long recordings are drawn as a min/max envelope rather than every sample
+        values, step = _minmax_envelope(audio_data)
         
+        # Evenly spaced points: Plotly derives x from x0/dx, and WebGL does the drawing
         fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=time_axis,
-            y=audio_data,
+        fig.add_trace(go.Scattergl(
+            y=values,
+            x0=0,
+            dx=step / self.sample_rate,
             mode='lines',
             name='Waveform',
             line=dict(color='blue', width=1)
@@ -401,15 +674,11 @@ class AudioTrainingLab:
         
         return fig
     
-    def create_spectrogram_plot(self, audio_data):
-        """Create spectrogram visualization"""
-        # Compute spectrogram
-        D = librosa.stft(audio_data)
-        S_db = librosa.amplitude_to_db(np.abs(D), ref=np.max)
-        
+    def create_spectrogram_plot(self, S_db, stride=1):
+        """Create spectrogram visualization from a dB spectrogram (see _spectrogram_db)"""
         # Create time and frequency axes
         times = librosa.frames_to_time(np.arange(S_db.shape[1]), sr=self.sample_rate)
-        freqs = librosa.fft_frequencies(sr=self.sample_rate)
+        freqs = librosa.fft_frequencies(sr=self.sample_rate)[::stride]
         
         fig = go.Figure(data=go.Heatmap(
             z=S_db,
@@ -428,17 +697,8 @@ class AudioTrainingLab:
         
         return fig
     
-    def create_fft_plot(self, audio_data):
-        """Create FFT frequency analysis plot"""
-        # Compute FFT
-        fft = np.fft.fft(audio_data)
-        freqs = np.fft.fftfreq(len(audio_data), 1/self.sample_rate)
-        magnitude = np.abs(fft)
-        
-        # Only plot positive frequencies
-        positive_freqs = freqs[:len(freqs)//2]
-        positive_magnitude = magnitude[:len(magnitude)//2]
-        
+    def create_fft_plot(self, positive_freqs, positive_magnitude):
+        """Create FFT frequency analysis plot (see _fft_magnitude)"""
         fig = go.Figure()
         fig.add_trace(go.Scatter(
             x=positive_freqs,
@@ -457,26 +717,11 @@ class AudioTrainingLab:
         
         return fig
     
-    def extract_spectral_features(self, audio_data):
-        """Extract spectral features from audio"""
-        # Spectral centroid
-        spectral_centroid = librosa.feature.spectral_centroid(y=audio_data, sr=self.sample_rate)[0]
-        
-        # Spectral rolloff
-        spectral_rolloff = librosa.feature.spectral_rolloff(y=audio_data, sr=self.sample_rate)[0]
-        
-        # Zero crossing rate
-        zcr = librosa.feature.zero_crossing_rate(audio_data)[0]
-        
-        # RMS energy
-        rms = librosa.feature.rms(y=audio_data)[0]
-        
-        return {
-            'spectral_centroid': np.mean(spectral_centroid),
-            'spectral_rolloff': np.mean(spectral_rolloff),
-            'zcr': np.mean(zcr),
-            'rms': np.mean(rms)
-        }
+    def extract_spectral_features(self, audio_data, S=None):
+        """Extract spectral features from audio (S: precomputed magnitude spectrogram, optional)"""
+        if S is None:
+            S = _magnitude_spectrogram(audio_data)
+        return _spectral_features(audio_data, S, self.sample_rate)
     
     def display_current_recording_analysis(self):
         """Display analysis of current recording"""
@@ -500,7 +745,7 @@ class AudioTrainingLab:
             st.write(f"**Speaker:** {recording['metadata']['speaker']}")
             st.write(f"**Type:** {recording['metadata']['type']}")
             st.write(f"**Timestamp:** {recording['timestamp']}")
-            st.write(f"**Duration:** {len(recording['audio']) / recording['sample_rate']:.2f}s")
+            st.write(f"**Duration:** {recording['duration_s']:.2f}s")
         
         with col2:
             st.markdown("**Description**")
@@ -515,7 +760,7 @@ class AudioTrainingLab:
         """Play selected recording"""
         try:
             recording = st.session_state.audio_lab_recordings[recording_idx]
-            st.audio(recording['audio'], sample_rate=recording['sample_rate'])
+            st.audio(_as_float(recording['audio']), sample_rate=recording['sample_rate'])
             st.success(f"Playing: {recording['metadata']['name']}")
         except Exception as e:
             st.error(f"Error playing recording: {str(e)}")
@@ -545,32 +790,64 @@ class AudioTrainingLab:
     
     def export_features_csv(self, selected_features):
         """Export extracted features as CSV"""
+        recordings = st.session_state.audio_lab_recordings
         features_data = []
-        
-        for i, recording in enumerate(st.session_state.audio_lab_recordings):
-            audio = recording['audio']
+        for i, recording in enumerate(recordings):
             features = {'recording_id': i}
             features.update(recording['metadata'])
+            features_data.append(features)
+        
+        want_mfcc = "MFCC (Mel-frequency cepstral coefficients)" in selected_features
+        want_centroid = "Spectral Centroid" in selected_features
+        want_rms = "Energy/RMS" in selected_features
+        
+        # Spectral features: batched STFTs per sample rate over zero-padded recordings
+        if want_mfcc or want_centroid:
+            groups = {}
+            for i, recording in enumerate(recordings):
+                groups.setdefault(recording['sample_rate'], []).append(i)
             
-            # Extract selected features
-            if "MFCC (Mel-frequency cepstral coefficients)" in selected_features:
-                mfcc = librosa.feature.mfcc(y=audio, sr=self.sample_rate, n_mfcc=13)
-                for j in range(13):
-                    features[f'mfcc_{j}'] = np.mean(mfcc[j])
-            
-            if "Spectral Centroid" in selected_features:
-                features['spectral_centroid'] = np.mean(
-                    librosa.feature.spectral_centroid(y=audio, sr=self.sample_rate)
-                )
-            
-            if "Energy/RMS" in selected_features:
+            for sr, indices in groups.items():
+                # Length-sorted, fixed-size batches: similar lengths keep padding small and
+                # the batch size bounds peak memory however many recordings there are
+                indices.sort(key=lambda i: len(recordings[i]['audio']))
+                for start in range(0, len(indices), EXPORT_BATCH_SIZE):
+                    batch_indices = indices[start:start + EXPORT_BATCH_SIZE]
+                    audios = [_as_float(recordings[i]['audio']) for i in batch_indices]
+                    longest = max(len(a) for a in audios)
+                    batch = np.stack([np.pad(a, (0, longest - len(a))) for a in audios])
+                    S = _magnitude_spectrogram(batch)  # (n_recordings, bins, frames)
+                    
+                    # Frames that lie within each recording (the rest only see padding)
+                    valid_frames = [1 + len(a) // HOP_LENGTH for a in audios]
+                    
+                    if want_mfcc:
+                        log_mel = librosa.power_to_db(_cached_mel_basis(sr, N_FFT, N_MELS) @ (S ** 2), top_db=None)
+                        for k, n_valid in enumerate(valid_frames):
+                            # top_db clipping relative to each recording's own peak
+                            peak = log_mel[k, :, :n_valid].max()
+                            np.maximum(log_mel[k], peak - 80.0, out=log_mel[k])
+                        mfcc = librosa.feature.mfcc(S=log_mel, n_mfcc=13)
+                    
+                    if want_centroid:
+                        centroid = librosa.feature.spectral_centroid(S=S, sr=sr, n_fft=N_FFT)
+                    
+                    for k, (i, n_valid) in enumerate(zip(batch_indices, valid_frames)):
+                        features = features_data[i]
+                        if want_mfcc:
+                            mfcc_means = mfcc[k, :, :n_valid].mean(axis=-1)
+                            for j in range(13):
+                                features[f'mfcc_{j}'] = mfcc_means[j]
+                        if want_centroid:
+                            features['spectral_centroid'] = np.mean(centroid[k, :, :n_valid])
+        
+        if want_rms:
+            for features, recording in zip(features_data, recordings):
                 features['rms_energy'] = np.mean(
-                    librosa.feature.rms(y=audio)
+                    librosa.feature.rms(y=_as_float(recording['audio']))
                 )
-            
-            # Add more features as needed...
-            
-            features_data.append(features)
+        
+        # Add more features as needed...
         
         df = pd.DataFrame(features_data)
         
@@ -595,7 +872,7 @@ class AudioTrainingLab:
         
         # Basic statistics
         total_recordings = len(st.session_state.audio_lab_recordings)
-        total_duration = sum(len(r['audio']) / r['sample_rate'] for r in st.session_state.audio_lab_recordings)
+        total_duration = sum(r['duration_s'] for r in st.session_state.audio_lab_recordings)
         
         col1, col2, col3 = st.columns(3)
         col1.metric("Total Recordings", total_recordings)
@@ -1,32 +1,91 @@
 import streamlit as st
 from database import db_manager
 import re
+import heapq
+import itertools
+import numpy as np
 from typing import Optional, Dict, Tuple
 
+# Bounded local part and explicit dot-separated domain labels, so matching never backtracks badly
+_EMAIL_RE = re.compile(r'\A[A-Za-z0-9._%+-]{1,64}@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,24}\Z')
+
+# Token -> user lookup, memoized so each rerun doesn't re-validate against the database
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_validate_session(session_token):
+    return db_manager.validate_session(session_token)
+
+# Dashboard queries, memoized per user so Streamlit reruns don't hit the database
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_user_stats(user_id):
+    return db_manager.get_user_stats(user_id)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_user_conversations(user_id):
+    return db_manager.get_user_conversations(user_id)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_predefined_sessions(user_id):
+    return db_manager.get_user_predefined_sessions(user_id)
+
+def _clear_dashboard_cache():
+    """Drop memoized dashboard data so the next render reads fresh rows"""
+    _cached_user_stats.clear()
+    _cached_user_conversations.clear()
+    _cached_predefined_sessions.clear()
+
+def _resume_session(session_type, session_id):
+    """Resume button callback: flags the session before the rerun, so the page resumes it without rebuilding the dashboard"""
+    if session_type == 'pdf':
+        st.session_state.current_conversation_id = session_id
+        st.session_state.resume_session = True
+    else:  # predefined
+        st.session_state.current_predefined_session_id = session_id
+        st.session_state.resume_predefined_session = True
+    _clear_dashboard_cache()
+
+# Above this many subjects the score average goes through the compiled kernel
+# (imported on first use, so app start doesn't pay for loading Numba)
+_KERNEL_MIN_SUBJECTS = 32
+
+# Session-state keys owned by AuthManager and their initial values
+_SESSION_DEFAULTS = (('authenticated', False), ('user_data', None), ('session_token', None))
+
 class AuthManager:
     def __init__(self):
         self.db = db_manager
-        
-        # Initialize session state
-        if 'authenticated' not in st.session_state:
-            st.session_state.authenticated = False
-        if 'user_data' not in st.session_state:
-            st.session_state.user_data = None
-        if 'session_token' not in st.session_state:
-            st.session_state.session_token = None
+    
+    def init_session_state(self):
+        """Initialize this session's auth keys (the manager itself is shared across sessions)"""
+        ss = st.session_state
+        for key, default in _SESSION_DEFAULTS:
+            if key not in ss:
+                ss[key] = default
     
     def is_valid_email(self, email: str) -> bool:
         """Validate email format"""
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return re.match(pattern, email) is not None
+        if not email or '@' not in email or len(email) > 254:
+            return False
+        return _EMAIL_RE.match(email) is not None
     
     def is_valid_password(self, password: str) -> Tuple[bool, str]:
         """Validate password strength"""
         if len(password) < 6:
             return False, "Password must be at least 6 characters long"
-        if not re.search(r'[A-Za-z]', password):
+        
+        # One pass for both character classes (ASCII only, as before), stopping once both are seen
+        has_letter = has_digit = False
+        for ch in password:
+            if ch.isascii():
+                if not has_letter and ch.isalpha():
+                    has_letter = True
+                elif not has_digit and ch.isdigit():
+                    has_digit = True
+                if has_letter and has_digit:
+                    break
+        
+        if not has_letter:
             return False, "Password must contain at least one letter"
-        if not re.search(r'[0-9]', password):
+        if not has_digit:
             return False, "Password must contain at least one number"
         return True, "Password is valid"
     
@@ -42,9 +101,11 @@ class AuthManager:
             session_token = self.db.create_session(user_data['id'])
             
             # Store in session state
-            st.session_state.authenticated = True
-            st.session_state.user_data = user_data
-            st.session_state.session_token = session_token
+            ss = st.session_state
+            ss.authenticated = True
+            ss.user_data = user_data
+            ss.session_token = session_token
+            _clear_dashboard_cache()
             
             return True, message
         else:
@@ -60,36 +121,46 @@ class AuthManager:
         if len(username) < 3:
             return False, "Username must be at least 3 characters long"
         
-        if not self.is_valid_email(email):
-            return False, "Please enter a valid email address"
-        
+        # Cheap comparisons first; the email pattern and character scan run last
         if password != confirm_password:
             return False, "Passwords do not match"
         
+        if len(password) < 6:
+            return False, "Password must be at least 6 characters long"
+        
+        if not self.is_valid_email(email):
+            return False, "Please enter a valid email address"
+        
         is_valid, password_message = self.is_valid_password(password)
         if not is_valid:
             return False, password_message
         
         # Create user
         success, message = self.db.create_user(username, email, password, full_name)
+        if success:
+            _clear_dashboard_cache()
         return success, message
     
     def logout_user(self):
         """Logout current user"""
         # Clear session state
-        st.session_state.authenticated = False
-        st.session_state.user_data = None
-        st.session_state.session_token = None
+        ss = st.session_state
+        ss.authenticated = False
+        ss.user_data = None
+        ss.session_token = None
+        _cached_validate_session.clear()
     
     def check_session(self) -> bool:
         """Check if current session is valid"""
-        if not st.session_state.get('session_token'):
+        ss = st.session_state
+        token = ss.get('session_token')
+        if not token:
             return False
         
-        user_data = self.db.validate_session(st.session_state.session_token)
+        user_data = _cached_validate_session(token)
         if user_data:
-            st.session_state.user_data = user_data
-            st.session_state.authenticated = True
+            ss.user_data = user_data
+            ss.authenticated = True
             return True
         else:
             self.logout_user()
@@ -97,8 +168,9 @@ class AuthManager:
     
     def get_current_user(self) -> Optional[Dict]:
         """Get current authenticated user data"""
-        if st.session_state.authenticated and st.session_state.user_data:
-            return st.session_state.user_data
+        ss = st.session_state
+        if ss.authenticated and ss.user_data:
+            return ss.user_data
         return None
     
     def require_authentication(self):
@@ -165,10 +237,15 @@ class AuthManager:
                 else:
                     st.error(message)
     
+    def invalidate_dashboard(self):
+        """Drop memoized dashboard data after a write, so progress shows up on the next render"""
+        _clear_dashboard_cache()
+    
     def show_user_profile_sidebar(self):
         """Show user profile information in sidebar"""
-        if st.session_state.authenticated and st.session_state.user_data:
-            user = st.session_state.user_data
+        ss = st.session_state
+        if ss.authenticated and ss.user_data:
+            user = ss.user_data
             
             st.sidebar.markdown("---")
             st.sidebar.subheader("👤 User Profile")
@@ -192,9 +269,9 @@ class AuthManager:
         st.subheader(f"Welcome back, {user.get('full_name', user['username'])}! 👋")
         
         # Get user statistics
-        user_stats = self.db.get_user_stats(user['id'])
-        conversations = self.db.get_user_conversations(user['id'])
-        predefined_sessions = self.db.get_user_predefined_sessions(user['id'])
+        user_stats = _cached_user_stats(user['id'])
+        conversations = _cached_user_conversations(user['id'])
+        predefined_sessions = _cached_predefined_sessions(user['id'])
         
         # Show statistics
         if user_stats:
@@ -202,9 +279,24 @@ class AuthManager:
             
             col1, col2, col3, col4 = st.columns(4)
             
-            total_sessions = sum(stats['sessions'] for stats in user_stats.values())
-            total_questions = sum(stats['questions_answered'] for stats in user_stats.values())
-            avg_score = sum(stats['average_score'] * stats['questions_answered'] for stats in user_stats.values()) / total_questions if total_questions > 0 else 0
+            # Totals and the question-weighted average score (compiled reduction for many subjects)
+            if len(user_stats) > _KERNEL_MIN_SUBJECTS:
+                import _kernels
+                n = len(user_stats)
+                stats_list = user_stats.values()
+                scores = np.fromiter((s['average_score'] for s in stats_list), dtype=np.float64, count=n)
+                questions = np.fromiter((s['questions_answered'] for s in stats_list), dtype=np.float64, count=n)
+                score_weighted, total_questions = _kernels.weighted_total(scores, questions)
+                total_questions = int(total_questions)
+                total_sessions = sum(s['sessions'] for s in stats_list)
+            else:
+                total_sessions = total_questions = score_weighted = 0
+                for stats in user_stats.values():
+                    total_sessions += stats['sessions']
+                    questions = stats['questions_answered']
+                    total_questions += questions
+                    score_weighted += stats['average_score'] * questions
+            avg_score = score_weighted / total_questions if total_questions > 0 else 0
             subjects_studied = len(user_stats)
             
             col1.metric("Total Sessions", total_sessions)
@@ -226,61 +318,57 @@ class AuthManager:
         if conversations or predefined_sessions:
             st.subheader("📖 Recent Study Sessions")
             
-            # Combine and sort all sessions by creation date
-            all_sessions = []
+            # Last 8 sessions, newest first: rank the raw rows with a bounded heap
+            # and only build display entries for the ones that are shown
+            rows = itertools.chain(
+                (('pdf', conv) for conv in conversations),
+                (('predefined', session) for session in predefined_sessions)
+            )
+            recent_rows = heapq.nlargest(8, rows, key=lambda item: item[1]['created_at'])
             
-            # Add PDF-based conversations
-            for conv in conversations:
-                all_sessions.append({
-                    'type': 'pdf',
-                    'id': conv['id'],
-                    'title': f"📄 {conv['subject']} - {conv['book_title']}",
-                    'created_at': conv['created_at'],
-                    'grade': conv['grade'],
-                    'questions_answered': conv['questions_answered'],
-                    'total_questions': conv['total_questions'],
-                    'total_score': conv['total_score'],
-                    'max_possible_score': conv['max_possible_score'],
-                    'status': conv['status']
-                })
+            # Display strings are rebuilt only when the shown sessions (or their progress) change
+            ss = st.session_state
+            sig = tuple(
+                (kind, row['id'], row['questions_answered'], row['total_score'], row['status'])
+                for kind, row in recent_rows
+            )
+            if ss.get('_dash_sig') != sig:
+                dash_rows = []
+                for kind, row in recent_rows:
+                    if kind == 'pdf':
+                        title = f"📄 {row['subject']} - {row['book_title']}"
+                    else:
+                        topic_display = f" - {row['topic']}" if row['topic'] else ""
+                        title = f"📋 {row['subject']}{topic_display}"
+                    dash_rows.append((
+                        f"{title} ({row['created_at'][:10]})",
+                        f"**Grade:** {row['grade']}",
+                        f"**Questions:** {row['questions_answered']}/{row['total_questions']}",
+                        f"**Score:** {row['total_score']}/{row['max_possible_score']}",
+                        f"**Status:** {row['status'].title()}",
+                        f"resume_{kind}_{row['id']}",
+                        (kind, row['id'])
+                    ))
+                ss['_dash_sig'] = sig
+                ss['_dash_rows'] = dash_rows
             
-            # Add predefined question sessions
-            for session in predefined_sessions:
-                topic_display = f" - {session['topic']}" if session['topic'] else ""
-                all_sessions.append({
-                    'type': 'predefined',
-                    'id': session['id'],
-                    'title': f"📋 {session['subject']}{topic_display}",
-                    'created_at': session['created_at'],
-                    'grade': session['grade'],
-                    'questions_answered': session['questions_answered'],
-                    'total_questions': session['total_questions'],
-                    'total_score': session['total_score'],
-                    'max_possible_score': session['max_possible_score'],
-                    'status': session['status']
-                })
-            
-            # Sort by creation date (newest first)
-            all_sessions.sort(key=lambda x: x['created_at'], reverse=True)
-            
-            # Show last 8 sessions
-            for session in all_sessions[:8]:
-                with st.expander(f"{session['title']} ({session['created_at'][:10]})"):
+            for header, grade, questions, score, status, resume_key, resume_args in ss['_dash_rows']:
+                with st.expander(header):
                     col1, col2, col3, col4 = st.columns(4)
-                    col1.write(f"**Grade:** {session['grade']}")
-                    col2.write(f"**Questions:** {session['questions_answered']}/{session['total_questions']}")
-                    col3.write(f"**Score:** {session['total_score']}/{session['max_possible_score']}")
-                    col4.write(f"**Status:** {session['status'].title()}")
+                    col1.write(grade)
+                    col2.write(questions)
+                    col3.write(score)
+                    col4.write(status)
                     
-                    resume_key = f"resume_{session['type']}_{session['id']}"
-                    if st.button(f"Resume Session", key=resume_key):
-                        if session['type'] == 'pdf':
-                            st.session_state.current_conversation_id = session['id']
-                            st.session_state.resume_session = True
-                        else:  # predefined
-                            st.session_state.current_predefined_session_id = session['id']
-                            st.session_state.resume_predefined_session = True
-                        st.rerun()
+                    st.button("Resume Session", key=resume_key,
+                              on_click=_resume_session, args=resume_args)
+
+@st.cache_resource
+def _shared_auth_manager() -> AuthManager:
+    return AuthManager()
 
-# Global auth manager instance
-auth_manager = AuthManager()
+def get_auth_manager() -> AuthManager:
+    """Auth manager, created on first use and shared across reruns and sessions"""
+    manager = _shared_auth_manager()
+    manager.init_session_state()
+    return manager
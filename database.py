@@ -1,216 +1,738 @@
 import sqlite3
+import logging
+import numpy as np
 import hashlib
+import hmac
+import math
+import os
 import uuid
+import shutil
+import tempfile
+import atexit
 from datetime import datetime
 import json
+import functools
+from pathlib import Path
+import queue
+from collections import deque
+import threading
+from contextlib import contextmanager, nullcontext
 from typing import Optional, Dict, List, Tuple
 
+logger = logging.getLogger(__name__)
+
+# Applied to every new connection: WAL so readers don't block the writer, fsync only at
+# checkpoints, a 64 MB page cache, in-memory temp tables, memory-mapped reads, and a
+# busy timeout so concurrent writers wait instead of failing
+CONNECTION_PRAGMAS = """
+    PRAGMA journal_mode = WAL;
+    PRAGMA synchronous = NORMAL;
+    PRAGMA cache_size = -64000;
+    PRAGMA temp_store = MEMORY;
+    PRAGMA mmap_size = 268435456;
+    PRAGMA busy_timeout = 5000;
+"""
+
+# Pragmas for the read-only connections (journal mode is a property of the file,
+# already set to WAL by the read-write connections)
+READ_CONNECTION_PRAGMAS = """
+    PRAGMA query_only = 1;
+    PRAGMA cache_size = -64000;
+    PRAGMA temp_store = MEMORY;
+    PRAGMA mmap_size = 268435456;
+    PRAGMA busy_timeout = 5000;
+"""
+
+# scrypt cost parameters for password hashing (16 MB of memory per hash)
+SCRYPT_N = 16384
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+
+# Full schema (tables, indexes, default subjects), run as one script in one transaction
+SCHEMA_SQL = """
+    BEGIN;
+
+    -- Users table
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        salt BLOB,
+        full_name TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_login TIMESTAMP,
+        is_active BOOLEAN DEFAULT 1
+    );
+
+    -- User sessions table
+    CREATE TABLE IF NOT EXISTS user_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        session_token BLOB UNIQUE NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP,
+        is_active BOOLEAN DEFAULT 1,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    );
+
+    -- Conversations/Study sessions table
+    CREATE TABLE IF NOT EXISTS conversations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        session_token TEXT,
+        name TEXT,
+        grade TEXT,
+        subject TEXT,
+        book_title TEXT,
+        pdf_content TEXT,
+        total_questions INTEGER DEFAULT 0,
+        questions_answered INTEGER DEFAULT 0,
+        total_score INTEGER DEFAULT 0,
+        max_possible_score INTEGER DEFAULT 0,
+        status TEXT DEFAULT 'active',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        completed_at TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    );
+
+    -- Questions table
+    CREATE TABLE IF NOT EXISTS questions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        conversation_id INTEGER NOT NULL,
+        question_text TEXT NOT NULL,
+        correct_answer TEXT NOT NULL,
+        difficulty_level TEXT NOT NULL,
+        question_order INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (conversation_id) REFERENCES conversations (id)
+    );
+
+    -- User answers table
+    CREATE TABLE IF NOT EXISTS user_answers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        question_id INTEGER NOT NULL,
+        user_answer TEXT,
+        score INTEGER,
+        answered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        time_taken INTEGER,
+        answer_method TEXT DEFAULT 'text',
+        FOREIGN KEY (question_id) REFERENCES questions (id)
+    );
+
+    -- User progress tracking
+    -- Keyed by (user, subject) so INSERT OR REPLACE updates in place
+    CREATE TABLE IF NOT EXISTS user_progress (
+        user_id INTEGER NOT NULL,
+        subject TEXT NOT NULL,
+        total_sessions INTEGER DEFAULT 0,
+        total_questions_answered INTEGER DEFAULT 0,
+        average_score REAL DEFAULT 0.0,
+        last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, subject),
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    ) WITHOUT ROWID;
+
+    -- Subjects table for predefined question bank
+    CREATE TABLE IF NOT EXISTS subjects (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL,
+        description TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    -- Topics table for organizing questions within subjects
+    CREATE TABLE IF NOT EXISTS topics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        subject_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        description TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (subject_id) REFERENCES subjects (id),
+        UNIQUE(subject_id, name)
+    );
+
+    -- Predefined question bank. Subject and topic are stored as ids; grade stays a short
+    -- TEXT code and difficulty REAL, since SQLite already writes whole-number REALs as integers
+    CREATE TABLE IF NOT EXISTS question_bank (
+        id TEXT PRIMARY KEY,
+        subject_id INTEGER NOT NULL,
+        topic_id INTEGER,
+        grade TEXT NOT NULL,
+        question_text TEXT NOT NULL,
+        answer_text TEXT NOT NULL,
+        difficulty REAL NOT NULL,
+        audio_heavy BOOLEAN DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (subject_id) REFERENCES subjects (id),
+        FOREIGN KEY (topic_id) REFERENCES topics (id)
+    );
+
+    -- Predefined question sessions - tracks when users work on predefined questions
+    CREATE TABLE IF NOT EXISTS predefined_question_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        name TEXT,
+        grade TEXT,
+        subject_id INTEGER,
+        topic_id INTEGER,
+        difficulty_range_min REAL DEFAULT 1.0,
+        difficulty_range_max REAL DEFAULT 100.0,
+        total_questions INTEGER DEFAULT 0,
+        questions_answered INTEGER DEFAULT 0,
+        total_score INTEGER DEFAULT 0,
+        max_possible_score INTEGER DEFAULT 0,
+        status TEXT DEFAULT 'active',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        completed_at TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id),
+        FOREIGN KEY (subject_id) REFERENCES subjects (id),
+        FOREIGN KEY (topic_id) REFERENCES topics (id)
+    );
+
+    -- Predefined question answers - tracks user answers to predefined questions
+    CREATE TABLE IF NOT EXISTS predefined_question_answers (
+        session_id INTEGER NOT NULL,
+        question_id TEXT NOT NULL,
+        user_answer TEXT,
+        score INTEGER,
+        answered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        time_taken INTEGER,
+        answer_method TEXT DEFAULT 'text',
+        PRIMARY KEY (session_id, question_id),
+        FOREIGN KEY (session_id) REFERENCES predefined_question_sessions (id),
+        FOREIGN KEY (question_id) REFERENCES question_bank (id)
+    ) WITHOUT ROWID;
+
+    -- Indexes on foreign-key and lookup columns used by the queries below
+    CREATE INDEX IF NOT EXISTS idx_conv_user ON conversations(user_id);
+    CREATE INDEX IF NOT EXISTS idx_questions_conv ON questions(conversation_id);
+    -- One answer per question (databases from before this held re-answers as extra rows; keep the latest)
+    DELETE FROM user_answers WHERE id NOT IN (SELECT MAX(id) FROM user_answers GROUP BY question_id);
+    -- Conversation progress counted every re-answer, so recount it from the remaining answers
+    UPDATE conversations SET
+        questions_answered = (SELECT COUNT(*) FROM user_answers ua JOIN questions q ON q.id = ua.question_id
+                              WHERE q.conversation_id = conversations.id),
+        total_score = (SELECT COALESCE(SUM(ua.score), 0) FROM user_answers ua JOIN questions q ON q.id = ua.question_id
+                       WHERE q.conversation_id = conversations.id);
+    CREATE UNIQUE INDEX IF NOT EXISTS ux_user_answers_q ON user_answers(question_id);
+    -- Covers the answer columns read by get_conversation_questions, so its LEFT JOIN never visits the table
+    DROP INDEX IF EXISTS idx_user_answers_q;
+    CREATE INDEX IF NOT EXISTS idx_ua_cover ON user_answers(question_id, user_answer, score, answered_at);
+    -- Token lookups use the UNIQUE constraint's autoindex; a separate index only slowed writes
+    DROP INDEX IF EXISTS idx_sessions_token;
+    -- Newest-first session list per user without a sort
+    DROP INDEX IF EXISTS idx_pqs_user;
+    CREATE INDEX IF NOT EXISTS idx_pqs_user_created ON predefined_question_sessions(user_id, created_at DESC);
+    -- Question-bank filters: equality prefix, then a difficulty range (with and without a topic)
+    CREATE INDEX IF NOT EXISTS idx_qbank_subject_grade_diff ON question_bank(subject_id, grade, difficulty);
+    CREATE INDEX IF NOT EXISTS idx_qb_filter ON question_bank(subject_id, grade, topic_id, difficulty);
+    -- Served by the composite primary keys of the WITHOUT ROWID tables
+    DROP INDEX IF EXISTS idx_pqa_session;
+    DROP INDEX IF EXISTS idx_progress_user;
+
+    -- Column-wise mirror of each session's answer scores and times (packed int16 arrays,
+    -- appended in batches) so analytics read two contiguous vectors instead of every answer row
+    CREATE TABLE IF NOT EXISTS predefined_question_metrics (
+        session_id INTEGER PRIMARY KEY,
+        scores BLOB NOT NULL,
+        times BLOB NOT NULL,
+        FOREIGN KEY (session_id) REFERENCES predefined_question_sessions (id)
+    );
+
+    -- Question-bank row counts per filter key and exact difficulty, kept current by the
+    -- triggers below so session creation sums a few counter rows instead of counting questions
+    -- (topic_key is topic_id with 0 for "no topic", since primary-key columns can't be NULL)
+    CREATE TABLE IF NOT EXISTS question_counts (
+        subject_id INTEGER NOT NULL,
+        grade TEXT NOT NULL,
+        topic_key INTEGER NOT NULL,
+        difficulty REAL NOT NULL,
+        cnt INTEGER NOT NULL,
+        PRIMARY KEY (subject_id, grade, topic_key, difficulty)
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS question_counts_ai AFTER INSERT ON question_bank BEGIN
+        INSERT INTO question_counts VALUES (NEW.subject_id, NEW.grade, COALESCE(NEW.topic_id, 0), NEW.difficulty, 1)
+        ON CONFLICT (subject_id, grade, topic_key, difficulty) DO UPDATE SET cnt = cnt + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS question_counts_ad AFTER DELETE ON question_bank BEGIN
+        UPDATE question_counts SET cnt = cnt - 1
+        WHERE subject_id = OLD.subject_id AND grade = OLD.grade
+          AND topic_key = COALESCE(OLD.topic_id, 0) AND difficulty = OLD.difficulty;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS question_counts_au
+    AFTER UPDATE OF subject_id, grade, topic_id, difficulty ON question_bank BEGIN
+        UPDATE question_counts SET cnt = cnt - 1
+        WHERE subject_id = OLD.subject_id AND grade = OLD.grade
+          AND topic_key = COALESCE(OLD.topic_id, 0) AND difficulty = OLD.difficulty;
+        INSERT INTO question_counts VALUES (NEW.subject_id, NEW.grade, COALESCE(NEW.topic_id, 0), NEW.difficulty, 1)
+        ON CONFLICT (subject_id, grade, topic_key, difficulty) DO UPDATE SET cnt = cnt + 1;
+    END;
+
+    -- Recount from scratch whenever the schema is (re)applied
+    DELETE FROM question_counts;
+    INSERT INTO question_counts
+    SELECT subject_id, grade, COALESCE(topic_id, 0), difficulty, COUNT(*)
+    FROM question_bank GROUP BY 1, 2, 3, 4;
+
+    -- Full-text index over question and answer bodies, reading its text from question_bank
+    -- by rowid (id is TEXT, so the implicit rowid is the key); the triggers keep it in step
+    -- and init_database rebuilds it after anything that may renumber rowids (VACUUM)
+    CREATE VIRTUAL TABLE IF NOT EXISTS question_bank_fts USING fts5(
+        question_text, answer_text, content='question_bank', content_rowid='rowid'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS qb_ai AFTER INSERT ON question_bank BEGIN
+        INSERT INTO question_bank_fts (rowid, question_text, answer_text)
+        VALUES (NEW.rowid, NEW.question_text, NEW.answer_text);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS qb_ad AFTER DELETE ON question_bank BEGIN
+        INSERT INTO question_bank_fts (question_bank_fts, rowid, question_text, answer_text)
+        VALUES ('delete', OLD.rowid, OLD.question_text, OLD.answer_text);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS qb_au AFTER UPDATE OF question_text, answer_text ON question_bank BEGIN
+        INSERT INTO question_bank_fts (question_bank_fts, rowid, question_text, answer_text)
+        VALUES ('delete', OLD.rowid, OLD.question_text, OLD.answer_text);
+        INSERT INTO question_bank_fts (rowid, question_text, answer_text)
+        VALUES (NEW.rowid, NEW.question_text, NEW.answer_text);
+    END;
+
+    -- Default subjects
+    INSERT OR IGNORE INTO subjects (name, description) VALUES
+        ('Economics', 'Economics questions for various grade levels'),
+        ('Chemistry', 'Chemistry questions for various grade levels'),
+        ('Physics', 'Physics questions for various grade levels'),
+        ('Mathematics', 'Mathematics questions for various grade levels');
+
+    COMMIT;
+"""
+
+# Stored in PRAGMA user_version once the schema and seed data are in place;
+# bump it when SCHEMA_SQL or the migrations in init_database change
+SCHEMA_VERSION = 11
+
+# Sample question-bank rows, loaded only when an empty bank is seeded
+SEED_QUESTIONS_PATH = Path(__file__).parent / "data" / "seed_questions.json"
+
+# Prebuilt database (schema and sample questions) copied into place on first run;
+# regenerate with `python database.py` after changing SCHEMA_SQL or the seed questions
+SEED_DB_PATH = Path(__file__).parent / "data" / "echolearn_seed.db"
+
+# Text level for each whole difficulty 0-100 (<= 30 Easy, <= 60 Moderate, else Difficult)
+_DIFF_LEVELS = tuple("Easy" if i <= 30 else "Moderate" if i <= 60 else "Difficult" for i in range(101))
+
+# Answer metrics are buffered per session and appended to predefined_question_metrics
+# once this many have accumulated (and on flush_metrics/close/exit); missing values are -1
+METRICS_FLUSH_ANSWERS = 16
+METRIC_MISSING = -1
+
+# Predefined-question answers are queued and written in one transaction by a background
+# writer, woken every interval or as soon as a batch has accumulated
+ANSWER_FLUSH_BATCH = 32
+ANSWER_FLUSH_INTERVAL_S = 0.2
+# Pause before retrying after a batch failed to write
+ANSWER_RETRY_DELAY_S = 5
+
+# Tables rebuilt as WITHOUT ROWID: the old copy is renamed to <table>_old before
+# SCHEMA_SQL runs, then its rows are copied across (oldest first, so the newest
+# row per key wins) and it is dropped
+_ROWID_MIGRATIONS = (
+    ('user_progress', """
+        INSERT OR REPLACE INTO user_progress
+        (user_id, subject, total_sessions, total_questions_answered, average_score, last_activity)
+        SELECT user_id, subject, total_sessions, total_questions_answered, average_score, last_activity
+        FROM user_progress_old WHERE subject IS NOT NULL ORDER BY id
+    """),
+    ('predefined_question_answers', """
+        INSERT OR REPLACE INTO predefined_question_answers
+        (session_id, question_id, user_answer, score, answered_at, time_taken, answer_method)
+        SELECT session_id, question_id, user_answer, score, answered_at, time_taken, answer_method
+        FROM predefined_question_answers_old ORDER BY id
+    """),
+)
+
+# PRAGMA auto_vacuum value for INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+# maintain() cadence and the most free pages it releases per pass
+MAINTENANCE_INTERVAL_S = 60 * 60
+VACUUM_PAGES_PER_PASS = 1000
+
+# Opt-in shared page cache across a manager's connections. Off by default: it trades
+# WAL's concurrent readers for table-level locks (SQLITE_LOCKED isn't retried by busy_timeout)
+SHARED_CACHE = False
+
+# Pre-opened connections per DatabaseManager
+POOL_SIZE = 4
+
+# Prepared statements kept per connection
+STATEMENT_CACHE_SIZE = 256
+
+# Hot-path statements as module constants, so each connection's statement cache
+# (STATEMENT_CACHE_SIZE) hands back the already-prepared form
+_SQL_USER_BY_USERNAME = """
+    SELECT id, username, email, full_name, created_at, is_active,
+           password_hash, salt
+    FROM users
+    WHERE username = ? AND is_active = 1
+"""
+
+_SQL_TOUCH_LAST_LOGIN = """
+    UPDATE users SET last_login = CURRENT_TIMESTAMP
+    WHERE id = ? AND (last_login IS NULL OR last_login < datetime('now', '-60 seconds'))
+"""
+
+_SQL_VALIDATE_SESSION = """
+    SELECT u.id, u.username, u.email, u.full_name, s.created_at
+    FROM users u
+    JOIN user_sessions s ON u.id = s.user_id
+    WHERE s.session_token = ? AND s.is_active = 1
+      AND (s.expires_at IS NULL OR s.expires_at > CURRENT_TIMESTAMP)
+      AND u.is_active = 1
+"""
+
+_SQL_PREVIOUS_ANSWER = """
+    SELECT score FROM user_answers WHERE question_id = ?
+"""
+
+_SQL_UPSERT_ANSWER = """
+    INSERT INTO user_answers
+    (question_id, user_answer, score, time_taken, answer_method)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(question_id) DO UPDATE SET
+        user_answer = excluded.user_answer, score = excluded.score,
+        time_taken = excluded.time_taken, answer_method = excluded.answer_method,
+        answered_at = CURRENT_TIMESTAMP
+"""
+
+# The question's conversation is looked up in the same statement when the caller doesn't pass it
+_SQL_ADD_CONVERSATION_PROGRESS = """
+    UPDATE conversations
+    SET questions_answered = questions_answered + ?, total_score = total_score + ?
+    WHERE id = COALESCE(?, (SELECT conversation_id FROM questions WHERE id = ?))
+"""
+
+_SQL_CONVERSATION_QUESTIONS = """
+    SELECT q.id, q.question_text AS question, q.correct_answer AS answer,
+           q.difficulty_level AS level, q.question_order AS "order",
+           COALESCE(ua.user_answer, '') AS user_answer, ua.score, ua.answered_at
+    FROM questions q
+    LEFT JOIN user_answers ua ON q.id = ua.question_id
+    WHERE q.conversation_id = ?
+    ORDER BY q.question_order
+"""
+
+_SQL_USER_CONVERSATIONS = """
+    SELECT id, name, grade, subject, book_title, total_questions,
+           questions_answered, total_score, max_possible_score,
+           status, created_at, completed_at
+    FROM conversations
+    WHERE user_id = ?
+    ORDER BY created_at DESC
+"""
+
+_SQL_REBUILD_QUESTION_FTS = "INSERT INTO question_bank_fts (question_bank_fts) VALUES ('rebuild')"
+
+_SQL_SEARCH_QUESTIONS = """
+    SELECT qb.id, s.name AS subject, t.name AS topic, qb.grade,
+           qb.question_text AS question, qb.answer_text AS answer,
+           qb.difficulty, qb.audio_heavy,
+           CASE WHEN qb.difficulty <= 30 THEN 'Easy'
+                WHEN qb.difficulty <= 60 THEN 'Moderate'
+                ELSE 'Difficult' END AS level
+    FROM question_bank_fts f
+    JOIN question_bank qb ON qb.rowid = f.rowid
+    JOIN subjects s ON qb.subject_id = s.id
+    LEFT JOIN topics t ON qb.topic_id = t.id
+    WHERE question_bank_fts MATCH ?
+    ORDER BY bm25(question_bank_fts)
+    LIMIT ?
+"""
+
+class ConnectionPool:
+    """Bounded pool of pre-configured connections, one held per thread at a time"""
+    
+    def __init__(self, connect, size: int = POOL_SIZE):
+        self._size = size
+        self._idle = queue.Queue()
+        for _ in range(size):
+            self._idle.put(connect())
+        self._held = threading.local()
+    
+    @contextmanager
+    def acquire(self):
+        """
+        Borrow a connection for a with-block; commits on success and rolls back on error
+        
+        Nested acquires on the same thread reuse the connection already held, so
+        the outermost block owns the transaction.
+        """
+        conn = getattr(self._held, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        
+        conn = self._idle.get()
+        self._held.conn = conn
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._held.conn = None
+            self._idle.put(conn)
+    
+    def close(self):
+        """Close every connection, waiting for borrowed ones to be returned"""
+        for _ in range(self._size):
+            self._idle.get().close()
+
+@contextmanager
+def _deferred_index(conn: sqlite3.Connection, *index_names: str):
+    """
+    Drop indexes for the duration of a bulk insert and rebuild them once afterwards
+    
+    Runs inside the caller's transaction (opened here if needed, since sqlite3 doesn't
+    begin one for DDL), so an error rolls the drops back and leaves the indexes in place.
+    """
+    placeholders = ", ".join("?" * len(index_names))
+    definitions = [row[0] for row in conn.execute(
+        f"SELECT sql FROM sqlite_master WHERE type = 'index' AND name IN ({placeholders})",
+        index_names
+    )]
+    
+    if definitions and not conn.in_transaction:
+        conn.execute("BEGIN")
+    for name in index_names:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    yield
+    for sql in definitions:
+        conn.execute(sql)
+
+def _begin_immediate(conn: sqlite3.Connection):
+    """
+    Take the write lock before a read-then-write sequence
+    
+    sqlite3 only begins a transaction at the first INSERT/UPDATE, so a SELECT before it runs
+    in autocommit and a concurrent writer can change the row in between. Nested in a caller's
+    transaction, this is a no-op.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+def _with_cursor(error_message: str, default=None, readonly: bool = False):
+    """
+    Run a DatabaseManager method with a cursor on a pooled connection
+    
+    The wrapped method takes the cursor after self; the pool commits on success. Errors
+    are logged and the method returns default() (or None when no default is given).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            try:
+                borrow = self._read_connection if readonly else self._connection
+                with borrow() as conn:
+                    return fn(self, conn.cursor(), *args, **kwargs)
+            except Exception:
+                logger.exception(error_message)
+                return default() if default is not None else None
+        return wrapper
+    return decorator
+
 class DatabaseManager:
-    def __init__(self, db_path: str = "echolearn.db"):
+    def __init__(self, db_path: str = "echolearn.db", pool_size: int = POOL_SIZE,
+                 shared_cache: bool = SHARED_CACHE, use_seed: bool = True):
         self.db_path = db_path
+        self.shared_cache = shared_cache
+        
+        # First run: start from the prebuilt, already seeded database instead of building one
+        if use_seed and not os.path.exists(db_path) and SEED_DB_PATH.exists():
+            shutil.copyfile(SEED_DB_PATH, db_path)
+        
+        # Warm connections (pragmas applied) shared across Streamlit's script threads.
+        # With a shared cache, writers would collide on table locks, so they queue for one connection
+        self._pool = ConnectionPool(self._connect, 1 if shared_cache else pool_size)
+        
+        # Memoized reference-data lookups, one cache per manager (see invalidate_caches)
+        self._subjects = functools.lru_cache(maxsize=1)(self._load_subjects)
+        self._topics_by_subject = functools.lru_cache(maxsize=32)(self._load_topics_by_subject)
+        self._grades_by_subject = functools.lru_cache(maxsize=32)(self._load_grades_by_subject)
+        
         self.init_database()
+        
+        # Separate read-only lane for SELECT-only methods; under WAL these never block writers
+        self._read_pool = ConnectionPool(self._connect_readonly, pool_size)
+        
+        # Periodic upkeep for the long-running server, plus a last pass at shutdown
+        self._closed = threading.Event()
+        threading.Thread(target=self._maintenance_loop, name="db-maintenance", daemon=True).start()
+        atexit.register(self.maintain)
+        
+        # Answer metrics waiting to be appended, per session (flushed before maintenance at exit)
+        self._metrics_lock = threading.Lock()
+        self._pending_metrics = {}
+        atexit.register(self.flush_metrics)
+        
+        # Predefined-question answers awaiting the writer thread (flushed again at exit)
+        self._answers_lock = threading.Lock()
+        self._pending_answers = deque()
+        self._answers_ready = threading.Event()
+        self._answers_failing = False
+        threading.Thread(target=self._answer_writer_loop, name="db-answer-writer", daemon=True).start()
+        atexit.register(self.flush_answers)
+    
+    def _uri(self, mode: str = None) -> str:
+        """SQLite URI for the database file, with the access mode and cache options"""
+        params = [f"mode={mode}"] if mode else []
+        if self.shared_cache:
+            params.append("cache=shared")
+        uri = Path(self.db_path).resolve().as_uri()
+        return f"{uri}?{'&'.join(params)}" if params else uri
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection with the performance pragmas applied"""
+        conn = sqlite3.connect(self._uri(), uri=True, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        conn.executescript(CONNECTION_PRAGMAS)
+        # Rows index by position (as before) and by column name
+        conn.row_factory = sqlite3.Row
+        return conn
+    
+    def _connect_readonly(self) -> sqlite3.Connection:
+        """Open a read-only connection to the (already initialized) database file"""
+        conn = sqlite3.connect(self._uri("ro"), uri=True, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        conn.executescript(READ_CONNECTION_PRAGMAS)
+        if self.shared_cache:
+            # Readers skip the shared cache's table read-locks instead of waiting on writers
+            conn.execute("PRAGMA read_uncommitted = 1")
+        conn.row_factory = sqlite3.Row
+        return conn
+    
+    def _connection(self):
+        """Borrow a pooled connection (see ConnectionPool.acquire)"""
+        return self._pool.acquire()
+    
+    def _read_connection(self):
+        """Borrow a pooled read-only connection for SELECT-only methods"""
+        return self._read_pool.acquire()
     
     def init_database(self):
         """Initialize the database with all necessary tables"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self._connection() as conn:
+            # Schema, migrations and seed data only run until the file is stamped current
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+                return
             
-            # Users table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    email TEXT UNIQUE NOT NULL,
-                    password_hash TEXT NOT NULL,
-                    full_name TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_login TIMESTAMP,
-                    is_active BOOLEAN DEFAULT 1
-                )
-            """)
-            
-            # User sessions table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_sessions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    session_token TEXT UNIQUE NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    expires_at TIMESTAMP,
-                    is_active BOOLEAN DEFAULT 1,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            """)
-            
-            # Conversations/Study sessions table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS conversations (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    session_token TEXT,
-                    name TEXT,
-                    grade TEXT,
-                    subject TEXT,
-                    book_title TEXT,
-                    pdf_content TEXT,
-                    total_questions INTEGER DEFAULT 0,
-                    questions_answered INTEGER DEFAULT 0,
-                    total_score INTEGER DEFAULT 0,
-                    max_possible_score INTEGER DEFAULT 0,
-                    status TEXT DEFAULT 'active',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    completed_at TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            """)
-            
-            # Questions table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS questions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    conversation_id INTEGER NOT NULL,
-                    question_text TEXT NOT NULL,
-                    correct_answer TEXT NOT NULL,
-                    difficulty_level TEXT NOT NULL,
-                    question_order INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (conversation_id) REFERENCES conversations (id)
-                )
-            """)
+            # Rowid layouts of the tables now declared WITHOUT ROWID are moved aside
+            for table, _ in _ROWID_MIGRATIONS:
+                columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if 'id' in columns:
+                    conn.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
             
-            # User answers table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_answers (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    question_id INTEGER NOT NULL,
-                    user_answer TEXT,
-                    score INTEGER,
-                    answered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    time_taken INTEGER,
-                    answer_method TEXT DEFAULT 'text',
-                    FOREIGN KEY (question_id) REFERENCES questions (id)
-                )
-            """)
+            conn.executescript(SCHEMA_SQL)
             
-            # User progress tracking
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_progress (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    subject TEXT,
-                    total_sessions INTEGER DEFAULT 0,
-                    total_questions_answered INTEGER DEFAULT 0,
-                    average_score REAL DEFAULT 0.0,
-                    last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            """)
+            # Databases created before per-user salts (those rows keep legacy SHA-256 hashes)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+            if 'salt' not in columns:
+                conn.execute("ALTER TABLE users ADD COLUMN salt BLOB")
             
-            # Subjects table for predefined question bank
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS subjects (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE NOT NULL,
-                    description TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+            for table, copy_sql in _ROWID_MIGRATIONS:
+                if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                (f"{table}_old",)).fetchone():
+                    conn.execute(copy_sql)
+                    conn.execute(f"DROP TABLE {table}_old")
             
-            # Topics table for organizing questions within subjects
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS topics (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    subject_id INTEGER NOT NULL,
-                    name TEXT NOT NULL,
-                    description TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (subject_id) REFERENCES subjects (id),
-                    UNIQUE(subject_id, name)
-                )
-            """)
+            # Schema and migrations are committed on their own, so a failed seed only undoes itself
+            conn.commit()
             
-            # Predefined question bank
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS question_bank (
-                    id TEXT PRIMARY KEY,
-                    subject_id INTEGER NOT NULL,
-                    topic_id INTEGER,
-                    grade TEXT NOT NULL,
-                    question_text TEXT NOT NULL,
-                    answer_text TEXT NOT NULL,
-                    difficulty REAL NOT NULL,
-                    audio_heavy BOOLEAN DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (subject_id) REFERENCES subjects (id),
-                    FOREIGN KEY (topic_id) REFERENCES topics (id)
-                )
-            """)
+            # Initialize sample question data
+            try:
+                self._initialize_default_data()
+            except Exception:
+                conn.rollback()
+                logger.exception("Error initializing default data")
+                # Left unstamped, so the next start retries the seeding
+                return
             
-            # Predefined question sessions - tracks when users work on predefined questions
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS predefined_question_sessions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    name TEXT,
-                    grade TEXT,
-                    subject_id INTEGER,
-                    topic_id INTEGER,
-                    difficulty_range_min REAL DEFAULT 1.0,
-                    difficulty_range_max REAL DEFAULT 100.0,
-                    total_questions INTEGER DEFAULT 0,
-                    questions_answered INTEGER DEFAULT 0,
-                    total_score INTEGER DEFAULT 0,
-                    max_possible_score INTEGER DEFAULT 0,
-                    status TEXT DEFAULT 'active',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    completed_at TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    FOREIGN KEY (subject_id) REFERENCES subjects (id),
-                    FOREIGN KEY (topic_id) REFERENCES topics (id)
-                )
-            """)
+            # Planner statistics for the fresh indexes and seed data
+            conn.execute("ANALYZE")
             
-            # Predefined question answers - tracks user answers to predefined questions
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS predefined_question_answers (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id INTEGER NOT NULL,
-                    question_id TEXT NOT NULL,
-                    user_answer TEXT,
-                    score INTEGER,
-                    answered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    time_taken INTEGER,
-                    answer_method TEXT DEFAULT 'text',
-                    FOREIGN KEY (session_id) REFERENCES predefined_question_sessions (id),
-                    FOREIGN KEY (question_id) REFERENCES question_bank (id),
-                    UNIQUE(session_id, question_id)
-                )
-            """)
+            # Incremental auto-vacuum lets maintain() release free pages; switching
+            # an existing file (or a fresh one, already stamped WAL) takes one VACUUM
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+                conn.executescript("PRAGMA auto_vacuum = INCREMENTAL; VACUUM;")
             
-            conn.commit()
+            # Reindex question text from scratch (VACUUM may have renumbered question_bank rowids)
+            conn.execute(_SQL_REBUILD_QUESTION_FTS)
             
-            # Initialize default subjects and basic data
-            self._initialize_default_data()
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     
-    def hash_password(self, password: str) -> str:
-        """Hash a password using SHA256"""
+    def maintain(self):
+        """Refresh planner statistics, release free pages and truncate the WAL"""
+        try:
+            with self._connection() as conn:
+                # executescript steps incremental_vacuum to completion (execute frees a single page)
+                conn.executescript(f"""
+                    PRAGMA optimize;
+                    PRAGMA incremental_vacuum({VACUUM_PAGES_PER_PASS});
+                    PRAGMA wal_checkpoint(TRUNCATE);
+                """)
+        except Exception:
+            logger.exception("Database maintenance error")
+    
+    def _maintenance_loop(self):
+        while not self._closed.wait(MAINTENANCE_INTERVAL_S):
+            self.maintain()
+    
+    def _answer_writer_loop(self):
+        while not self._closed.is_set():
+            self._answers_ready.wait(ANSWER_FLUSH_INTERVAL_S)
+            self._answers_ready.clear()
+            if not self.flush_answers():
+                self._closed.wait(ANSWER_RETRY_DELAY_S)
+    
+    def close(self):
+        """Stop maintenance and close all pooled connections"""
+        self._closed.set()
+        self.flush_answers()
+        self.flush_metrics()
+        atexit.unregister(self.flush_answers)
+        atexit.unregister(self.flush_metrics)
+        atexit.unregister(self.maintain)
+        self._read_pool.close()
+        self._pool.close()
+    
+    def hash_password(self, password: str, salt: bytes) -> str:
+        """Hash a password with scrypt and the user's salt"""
+        return hashlib.scrypt(password.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P).hex()
+    
+    def _legacy_hash_password(self, password: str) -> str:
+        """Unsalted SHA256 used by accounts created before scrypt"""
         return hashlib.sha256(password.encode()).hexdigest()
     
-    def generate_session_token(self) -> str:
-        """Generate a unique session token"""
-        return str(uuid.uuid4())
+    def generate_session_token(self) -> bytes:
+        """Generate a unique session token (16 raw bytes, half the size of the UUID text)"""
+        return uuid.uuid4().bytes
     
     def create_user(self, username: str, email: str, password: str, full_name: str = None) -> Tuple[bool, str]:
         """Create a new user account"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
-                password_hash = self.hash_password(password)
+                salt = os.urandom(SALT_BYTES)
+                password_hash = self.hash_password(password, salt)
                 
                 cursor.execute("""
-                    INSERT INTO users (username, email, password_hash, full_name)
-                    VALUES (?, ?, ?, ?)
-                """, (username, email, password_hash, full_name))
+                    INSERT INTO users (username, email, password_hash, salt, full_name)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (username, email, password_hash, salt, full_name))
                 
                 conn.commit()
                 return True, "User created successfully"
@@ -227,24 +749,31 @@ class DatabaseManager:
     def authenticate_user(self, username: str, password: str) -> Tuple[bool, Optional[Dict], str]:
         """Authenticate a user and return user info"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
-                password_hash = self.hash_password(password)
                 
-                cursor.execute("""
-                    SELECT id, username, email, full_name, created_at, is_active
-                    FROM users 
-                    WHERE username = ? AND password_hash = ? AND is_active = 1
-                """, (username, password_hash))
+                # Look the user up by username (unique index), then verify the hash in Python
+                cursor.execute(_SQL_USER_BY_USERNAME, (username,))
                 
                 user = cursor.fetchone()
+                if user:
+                    stored_hash, salt = user[6], user[7]
+                    if salt is None:
+                        password_ok = hmac.compare_digest(self._legacy_hash_password(password), stored_hash)
+                        if password_ok:
+                            # Upgrade the legacy hash now that the plain password is known
+                            salt = os.urandom(SALT_BYTES)
+                            cursor.execute("""
+                                UPDATE users SET password_hash = ?, salt = ? WHERE id = ?
+                            """, (self.hash_password(password, salt), salt, user[0]))
+                    else:
+                        password_ok = hmac.compare_digest(self.hash_password(password, salt), stored_hash)
+                    if not password_ok:
+                        user = None
                 
                 if user:
-                    # Update last login
-                    cursor.execute("""
-                        UPDATE users SET last_login = CURRENT_TIMESTAMP 
-                        WHERE id = ?
-                    """, (user[0],))
+                    # Update last login, at most once a minute so repeat logins skip the write
+                    cursor.execute(_SQL_TOUCH_LAST_LOGIN, (user[0],))
                     conn.commit()
                     
                     user_data = {
@@ -262,10 +791,10 @@ class DatabaseManager:
         except Exception as e:
             return False, None, f"Authentication error: {str(e)}"
     
-    def create_session(self, user_id: int) -> str:
+    def create_session(self, user_id: int) -> bytes:
         """Create a new session for a user"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 session_token = self.generate_session_token()
                 
@@ -279,18 +808,13 @@ class DatabaseManager:
         except Exception as e:
             raise Exception(f"Error creating session: {str(e)}")
     
-    def validate_session(self, session_token: str) -> Optional[Dict]:
+    def validate_session(self, session_token: bytes) -> Optional[Dict]:
         """Validate a session token and return user info"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._read_connection() as conn:
                 cursor = conn.cursor()
                 
-                cursor.execute("""
-                    SELECT u.id, u.username, u.email, u.full_name, s.created_at
-                    FROM users u
-                    JOIN user_sessions s ON u.id = s.user_id
-                    WHERE s.session_token = ? AND s.is_active = 1 AND u.is_active = 1
-                """, (session_token,))
+                cursor.execute(_SQL_VALIDATE_SESSION, (session_token,))
                 
                 result = cursor.fetchone()
                 
@@ -304,15 +828,15 @@ class DatabaseManager:
                     }
                 return None
                 
-        except Exception as e:
-            print(f"Session validation error: {str(e)}")
+        except Exception:
+            logger.exception("Session validation error")
             return None
     
     def create_conversation(self, user_id: int, name: str, grade: str, subject: str, 
                           book_title: str, pdf_content: str = None) -> int:
         """Create a new conversation/study session"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute("""
@@ -329,17 +853,28 @@ class DatabaseManager:
     
     def save_questions(self, conversation_id: int, questions_data: List[Dict]) -> bool:
         """Save generated questions to database"""
+        return self._save_questions(conversation_id, questions_data, bulk=False)
+    
+    def bulk_save_questions(self, conversation_id: int, questions_data: List[Dict]) -> bool:
+        """Save a large batch of questions (imports), rebuilding idx_questions_conv once instead of per row"""
+        return self._save_questions(conversation_id, questions_data, bulk=True)
+    
+    def _save_questions(self, conversation_id: int, questions_data: List[Dict], bulk: bool) -> bool:
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn, \
+                    (_deferred_index(conn, 'idx_questions_conv') if bulk else nullcontext()):
                 cursor = conn.cursor()
                 
-                for i, qa in enumerate(questions_data):
-                    cursor.execute("""
-                        INSERT INTO questions (conversation_id, question_text, correct_answer, 
-                                             difficulty_level, question_order)
-                        VALUES (?, ?, ?, ?, ?)
-                    """, (conversation_id, qa['question'], qa['answer'], 
-                         qa['level'], i + 1))
+                # One prepared INSERT for all rows; the UPDATE below joins the same transaction
+                rows = [
+                    (conversation_id, qa['question'], qa['answer'], qa['level'], i + 1)
+                    for i, qa in enumerate(questions_data)
+                ]
+                cursor.executemany("""
+                    INSERT INTO questions (conversation_id, question_text, correct_answer, 
+                                         difficulty_level, question_order)
+                    VALUES (?, ?, ?, ?, ?)
+                """, rows)
                 
                 # Update conversation with total questions
                 cursor.execute("""
@@ -348,483 +883,239 @@ class DatabaseManager:
                     WHERE id = ?
                 """, (len(questions_data), len(questions_data) * 10, conversation_id))
                 
-                conn.commit()
+                # No commit here: the pool commits once _deferred_index has rebuilt the index,
+                # so the drop, load and rebuild land in one transaction
                 return True
                 
-        except Exception as e:
-            print(f"Error saving questions: {str(e)}")
+        except Exception:
+            logger.exception("Error saving questions")
             return False
     
     def save_user_answer(self, question_id: int, user_answer: str, score: int, 
-                        time_taken: int = None, answer_method: str = 'text') -> bool:
-        """Save a user's answer to a question"""
+                        time_taken: int = None, answer_method: str = 'text',
+                        conversation_id: int = None) -> bool:
+        """Save a user's answer to a question (pass conversation_id when known to skip its lookup)"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 
-                # Insert or update user answer
-                cursor.execute("""
-                    INSERT OR REPLACE INTO user_answers 
-                    (question_id, user_answer, score, time_taken, answer_method)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (question_id, user_answer, score, time_taken, answer_method))
-                
-                # Update conversation progress
-                cursor.execute("""
-                    SELECT conversation_id FROM questions WHERE id = ?
-                """, (question_id,))
-                conversation_id = cursor.fetchone()[0]
+                # The previous score and the progress delta it decides must be read under the write lock
+                _begin_immediate(conn)
                 
-                # Calculate current progress
-                cursor.execute("""
-                    SELECT COUNT(*), SUM(score)
-                    FROM user_answers ua
-                    JOIN questions q ON ua.question_id = q.id
-                    WHERE q.conversation_id = ?
-                """, (conversation_id,))
+                # One answer per question (unique index): a re-answer updates the existing row in place
+                cursor.execute(_SQL_PREVIOUS_ANSWER, (question_id,))
+                previous = cursor.fetchone()
                 
-                answered, total_score = cursor.fetchone()
-                answered = answered or 0
-                total_score = total_score or 0
+                cursor.execute(_SQL_UPSERT_ANSWER, (question_id, user_answer, score, time_taken, answer_method))
+                if previous:
+                    answered_delta = 0
+                    score_delta = (score or 0) - (previous[0] or 0)
+                else:
+                    answered_delta = 1
+                    score_delta = score or 0
                 
-                cursor.execute("""
-                    UPDATE conversations 
-                    SET questions_answered = ?, total_score = ?
-                    WHERE id = ?
-                """, (answered, total_score, conversation_id))
+                # Update conversation progress by this answer's delta (no re-aggregation)
+                cursor.execute(_SQL_ADD_CONVERSATION_PROGRESS,
+                               (answered_delta, score_delta, conversation_id, question_id))
                 
                 conn.commit()
                 return True
                 
-        except Exception as e:
-            print(f"Error saving user answer: {str(e)}")
+        except Exception:
+            logger.exception("Error saving user answer")
             return False
     
-    def get_conversation_questions(self, conversation_id: int) -> List[Dict]:
+    @_with_cursor("Error getting conversation questions", default=list, readonly=True)
+    def get_conversation_questions(self, cursor, conversation_id: int) -> List[Dict]:
         """Get all questions for a conversation with user answers"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                cursor.execute("""
-                    SELECT q.id, q.question_text, q.correct_answer, q.difficulty_level,
-                           q.question_order, ua.user_answer, ua.score, ua.answered_at
-                    FROM questions q
-                    LEFT JOIN user_answers ua ON q.id = ua.question_id
-                    WHERE q.conversation_id = ?
-                    ORDER BY q.question_order
-                """, (conversation_id,))
-                
-                questions = []
-                for row in cursor.fetchall():
-                    questions.append({
-                        'id': row[0],
-                        'question': row[1],
-                        'answer': row[2],
-                        'level': row[3],
-                        'order': row[4],
-                        'user_answer': row[5] or '',
-                        'score': row[6],
-                        'answered_at': row[7]
-                    })
-                
-                return questions
-                
-        except Exception as e:
-            print(f"Error getting conversation questions: {str(e)}")
-            return []
+        # Columns are aliased to the dict keys, so each Row converts directly
+        rows = cursor.execute(_SQL_CONVERSATION_QUESTIONS, (conversation_id,)).fetchall()
+        return list(map(dict, rows))
     
-    def get_user_conversations(self, user_id: int) -> List[Dict]:
+    @_with_cursor("Error getting user conversations", default=list, readonly=True)
+    def get_user_conversations(self, cursor, user_id: int) -> List[Dict]:
         """Get all conversations for a user"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                cursor.execute("""
-                    SELECT id, name, grade, subject, book_title, total_questions,
-                           questions_answered, total_score, max_possible_score,
-                           status, created_at, completed_at
-                    FROM conversations
-                    WHERE user_id = ?
-                    ORDER BY created_at DESC
-                """, (user_id,))
-                
-                conversations = []
-                for row in cursor.fetchall():
-                    conversations.append({
-                        'id': row[0],
-                        'name': row[1],
-                        'grade': row[2],
-                        'subject': row[3],
-                        'book_title': row[4],
-                        'total_questions': row[5],
-                        'questions_answered': row[6],
-                        'total_score': row[7],
-                        'max_possible_score': row[8],
-                        'status': row[9],
-                        'created_at': row[10],
-                        'completed_at': row[11]
-                    })
-                
-                return conversations
-                
-        except Exception as e:
-            print(f"Error getting user conversations: {str(e)}")
-            return []
+        rows = cursor.execute(_SQL_USER_CONVERSATIONS, (user_id,)).fetchall()
+        return list(map(dict, rows))
     
-    def update_user_progress(self, user_id: int, subject: str):
+    @_with_cursor("Error updating user progress")
+    def update_user_progress(self, cursor, user_id: int, subject: str):
         """Update user's overall progress statistics"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Calculate progress stats
-                cursor.execute("""
-                    SELECT COUNT(DISTINCT c.id) as sessions,
-                           COUNT(ua.id) as total_answers,
-                           AVG(CAST(ua.score as FLOAT)) as avg_score
-                    FROM conversations c
-                    LEFT JOIN questions q ON c.id = q.conversation_id
-                    LEFT JOIN user_answers ua ON q.id = ua.question_id
-                    WHERE c.user_id = ? AND c.subject = ?
-                """, (user_id, subject))
-                
-                result = cursor.fetchone()
-                sessions, total_answers, avg_score = result
-                sessions = sessions or 0
-                total_answers = total_answers or 0
-                avg_score = avg_score or 0.0
-                
-                cursor.execute("""
-                    INSERT OR REPLACE INTO user_progress 
-                    (user_id, subject, total_sessions, total_questions_answered, 
-                     average_score, last_activity)
-                    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                """, (user_id, subject, sessions, total_answers, avg_score))
-                
-                conn.commit()
-                
-        except Exception as e:
-            print(f"Error updating user progress: {str(e)}")
+        # Calculate progress stats
+        cursor.execute("""
+            SELECT COUNT(DISTINCT c.id) as sessions,
+                   COUNT(ua.id) as total_answers,
+                   AVG(CAST(ua.score as FLOAT)) as avg_score
+            FROM conversations c
+            LEFT JOIN questions q ON c.id = q.conversation_id
+            LEFT JOIN user_answers ua ON q.id = ua.question_id
+            WHERE c.user_id = ? AND c.subject = ?
+        """, (user_id, subject))
+        
+        result = cursor.fetchone()
+        sessions, total_answers, avg_score = result
+        sessions = sessions or 0
+        total_answers = total_answers or 0
+        avg_score = avg_score or 0.0
+        
+        cursor.execute("""
+            INSERT OR REPLACE INTO user_progress 
+            (user_id, subject, total_sessions, total_questions_answered, 
+             average_score, last_activity)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """, (user_id, subject, sessions, total_answers, avg_score))
     
-    def get_user_stats(self, user_id: int) -> Dict:
+    @_with_cursor("Error getting user stats", default=dict, readonly=True)
+    def get_user_stats(self, cursor, user_id: int) -> Dict:
         """Get user's overall statistics"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                cursor.execute("""
-                    SELECT subject, total_sessions, total_questions_answered,
-                           average_score, last_activity
-                    FROM user_progress
-                    WHERE user_id = ?
-                """, (user_id,))
-                
-                progress = {}
-                for row in cursor.fetchall():
-                    progress[row[0]] = {
-                        'sessions': row[1],
-                        'questions_answered': row[2],
-                        'average_score': row[3],
-                        'last_activity': row[4]
-                    }
-                
-                return progress
-                
-        except Exception as e:
-            print(f"Error getting user stats: {str(e)}")
-            return {}
+        cursor.execute("""
+            SELECT subject, total_sessions, total_questions_answered,
+                   average_score, last_activity
+            FROM user_progress
+            WHERE user_id = ?
+        """, (user_id,))
+        
+        progress = {}
+        for row in cursor:
+            progress[row[0]] = {
+                'sessions': row[1],
+                'questions_answered': row[2],
+                'average_score': row[3],
+                'last_activity': row[4]
+            }
+        
+        return progress
     
     def _initialize_default_data(self):
-        """Initialize default subjects and sample question data"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Add default subjects if they don't exist
-                subjects = ['Economics', 'Chemistry', 'Physics', 'Mathematics']
-                for subject in subjects:
-                    cursor.execute("""
-                        INSERT OR IGNORE INTO subjects (name, description) 
-                        VALUES (?, ?)
-                    """, (subject, f"{subject} questions for various grade levels"))
-                
-                conn.commit()
-                
-                # Add sample questions if question bank is empty
-                cursor.execute("SELECT COUNT(*) FROM question_bank")
-                if cursor.fetchone()[0] == 0:
-                    self._add_sample_questions()
-                    
-        except Exception as e:
-            print(f"Error initializing default data: {str(e)}")
+        """Initialize sample question data (default subjects come from SCHEMA_SQL); errors propagate"""
+        with self._connection() as conn:
+            # Add sample questions if question bank is empty
+            if conn.execute("SELECT 1 FROM question_bank LIMIT 1").fetchone() is None:
+                self._add_sample_questions()
     
     def _add_sample_questions(self):
-        """Add sample questions from user data"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Get subject IDs
-                cursor.execute("SELECT id, name FROM subjects")
-                subject_map = {name: id for id, name in cursor.fetchall()}
-                
-                # Sample questions data based on user's provided data
-                sample_questions = [
-                    # Economics questions
-                    {
-                        'id': '23f31',
-                        'subject': 'Economics',
-                        'topic': 'Production Possibilities',
-                        'grade': '11',
-                        'question': 'Explain why, for an economy operating at a point on its production possibilities curve (PPC), choices about what to produce might be necessary. [10]',
-                        'answer': 'When an economy operates on its PPC, it is using all its resources efficiently. At this point, producing more of one good requires sacrificing some of another good due to resource constraints and opportunity cost. Choices are necessary because: 1) Resources are scarce relative to wants, 2) Different combinations of goods can be produced along the PPC, 3) Society must decide which combination best meets its needs and preferences, 4) Opportunity cost exists - choosing more of one good means less of another.',
-                        'difficulty': 25,
-                        'audio_heavy': True
-                    },
-                    {
-                        'id': 'ec001',
-                        'subject': 'Economics',
-                        'topic': 'Economic Models',
-                        'grade': '11',
-                        'question': 'Explain why economists employ the ceteris paribus assumption when modelling and predicting economic activity.[2] Comment on John Maynard Keynes\'s impact on the government\'s role in the economy.[2]',
-                        'answer': 'Ceteris paribus (other things being equal) allows economists to isolate the effect of one variable by assuming all other variables remain constant, making complex economic relationships easier to analyze and understand. Keynes revolutionized economics by arguing that government intervention was necessary to address market failures and economic downturns, particularly through fiscal policy and demand management, shifting away from classical free-market approaches.',
-                        'difficulty': 20,
-                        'audio_heavy': True
-                    },
-                    {
-                        'id': 'ec002',
-                        'subject': 'Economics',
-                        'topic': 'Supply and Demand',
-                        'grade': '11',
-                        'question': 'Explain one reason for increased quantity supplied and one reason for an increase in supply.',
-                        'answer': 'Increased quantity supplied occurs when price increases, causing producers to move along the same supply curve to produce more at the higher price. An increase in supply occurs when the entire supply curve shifts right due to factors like: lower production costs, improved technology, government subsidies, or favorable weather conditions, allowing producers to supply more at every price level.',
-                        'difficulty': 30,
-                        'audio_heavy': True
-                    },
-                    
-                    # Chemistry questions  
-                    {
-                        'id': '89gh2',
-                        'subject': 'Chemistry',
-                        'topic': 'Atomic Structure',
-                        'grade': '11', 
-                        'question': 'The atom of element X has a mass number of 127 and has 74 neutrons. The ion derived from X has 54 electrons. Calculate the number of protons of element X. [1] State the nuclear symbol of the ion formed (refer to the periodic table). [2] An isotope of X has a mass number of 132. Determine the number of neutrons in its atom. [2]',
-                        'answer': 'Number of protons = Mass number - Neutrons = 127 - 74 = 53 protons. Since the ion has 54 electrons and the atom has 53 protons, this is an anion with charge -1. Element with 53 protons is Iodine (I). Nuclear symbol: ¹²⁷I⁻. For the isotope with mass number 132: Number of neutrons = 132 - 53 = 79 neutrons.',
-                        'difficulty': 16,
-                        'audio_heavy': False
-                    },
-                    
-                    # Physics questions
-                    {
-                        'id': 'ph001',
-                        'subject': 'Physics',
-                        'topic': 'Energy and Motion',
-                        'grade': '11',
-                        'question': 'A ball is released from rest at the top of a frictionless incline. Explain, using energy considerations, why the ball accelerates as it moves down the slope.',
-                        'answer': 'Initially, the ball has maximum gravitational potential energy (PE = mgh) and zero kinetic energy. As it moves down the incline, potential energy converts to kinetic energy (KE = ½mv²). Since total mechanical energy is conserved on a frictionless surface, the loss in potential energy equals the gain in kinetic energy. As kinetic energy increases, velocity increases, meaning the ball accelerates down the slope.',
-                        'difficulty': 35,
-                        'audio_heavy': True
-                    },
-                    {
-                        'id': 'ph002',
-                        'subject': 'Physics',
-                        'topic': 'Kinetic Theory',
-                        'grade': '11',
-                        'question': 'Describe how the kinetic model of matter explains the pressure exerted by a gas in a container.',
-                        'answer': 'According to kinetic theory, gas molecules are in constant random motion, colliding elastically with container walls. Each collision exerts a small force on the wall. With billions of molecules colliding per second, these individual forces combine to create a steady pressure. Pressure depends on: 1) Number of collisions per unit time, 2) Average force per collision (related to molecular speed/kinetic energy), 3) Temperature (higher temperature = faster molecules = more frequent, harder collisions).',
-                        'difficulty': 45,
-                        'audio_heavy': True
-                    },
-                    {
-                        'id': 'ph003',
-                        'subject': 'Physics',
-                        'topic': 'Waves',
-                        'grade': '11',
-                        'question': 'Outline how the principle of superposition leads to the formation of standing waves in a stretched string fixed at both ends.',
-                        'answer': 'When a wave travels down the string and reflects from the fixed ends, incident and reflected waves travel in opposite directions. According to superposition principle, these waves combine algebraically. At specific frequencies, constructive interference creates nodes (points of zero amplitude) and antinodes (points of maximum amplitude) at fixed positions. The wavelength relationship λ = 2L/n (where L is string length, n is harmonic number) ensures waves fit exactly between fixed ends, creating stable standing wave patterns.',
-                        'difficulty': 25,
-                        'audio_heavy': True
-                    },
-                    
-                    # Additional Economics questions from user data
-                    {
-                        'id': 'ec003',
-                        'subject': 'Economics',
-                        'topic': 'Market Analysis',
-                        'grade': '11',
-                        'question': 'Using a demand and supply diagram, explain how the lack of infrastructure may have affected the manufacturing sector in Colombia. [4]',
-                        'answer': 'Lack of infrastructure increases production costs for manufacturers. This shifts the supply curve leftward (decrease in supply), resulting in higher equilibrium price and lower equilibrium quantity. The diagram would show: 1) Original supply curve S1, 2) New supply curve S2 (shifted left), 3) Higher price P2 vs P1, 4) Lower quantity Q2 vs Q1. This reduces competitiveness and output in the manufacturing sector.',
-                        'difficulty': 45,
-                        'audio_heavy': True
-                    },
-                    {
-                        'id': 'ec004',
-                        'subject': 'Economics',
-                        'topic': 'Market Relationships',
-                        'grade': '11',
-                        'question': 'Sketch a demand and supply diagram to show the effect of an increase in the price of mate gourds on the bombilla market.[3] Using your answer, outline why a change in the price of mate gourds impacts the bombilla market.[2]',
-                        'answer': 'Mate gourds and bombillas are complementary goods. When gourd prices increase: 1) Demand for gourds decreases, 2) This reduces demand for bombillas (leftward shift of demand curve), 3) Results in lower equilibrium price and quantity for bombillas. The impact occurs because complementary goods are consumed together - when one becomes more expensive, demand for both products falls.',
-                        'difficulty': 42,
-                        'audio_heavy': True
-                    },
-                    {
-                        'id': 'ec005',
-                        'subject': 'Economics',
-                        'topic': 'Supply Relationships',
-                        'grade': '11',
-                        'question': 'Explain how an increase in the price of beef might affect the supply of leather and the supply of poultry. [10]',
-                        'answer': 'Beef and leather are joint products (produced together from cattle). Higher beef prices increase cattle slaughter, increasing leather supply (rightward shift). For poultry: beef and chicken are substitute goods in consumption. Higher beef prices increase poultry demand, raising poultry prices and encouraging increased poultry supply (rightward shift). Both effects demonstrate how price changes in one market can create spillover effects in related markets through production and consumption linkages.',
-                        'difficulty': 46,
-                        'audio_heavy': True
-                    },
-                    
-                    # Additional Physics questions
-                    {
-                        'id': 'ph004',
-                        'subject': 'Physics',
-                        'topic': 'Electromagnetism',
-                        'grade': '11',
-                        'question': 'Explain, with reference to electron flow, why a current-carrying conductor placed in a magnetic field experiences a force.',
-                        'answer': 'When current flows through a conductor, electrons move in a specific direction. In a magnetic field, moving charged particles experience a magnetic force (Lorentz force). The force on each electron is F = qvB sinθ, where q is electron charge, v is drift velocity, and B is magnetic field strength. The collective effect of forces on all moving electrons is transmitted to the conductor itself, causing the conductor to experience a net force in the direction given by Fleming\'s left-hand rule.',
-                        'difficulty': 50,
-                        'audio_heavy': True
-                    },
-                    {
-                        'id': 'ph005',
-                        'subject': 'Physics',
-                        'topic': 'Orbital Mechanics',
-                        'grade': '11',
-                        'question': 'Explain why satellites in orbit around Earth are said to be in "free fall" even though they do not appear to fall towards Earth.',
-                        'answer': 'Satellites are in continuous free fall toward Earth under gravitational force. However, they also have sufficient horizontal velocity that as they fall, Earth\'s curved surface falls away beneath them at the same rate. This creates a stable orbit where the satellite is always falling but never getting closer to Earth\'s surface. The centripetal acceleration (v²/r) exactly equals gravitational acceleration (GM/r²), maintaining constant orbital radius.',
-                        'difficulty': 35,
-                        'audio_heavy': True
-                    },
-                    {
-                        'id': 'ph006',
-                        'subject': 'Physics',
-                        'topic': 'Quantum Physics',
-                        'grade': '11',
-                        'question': 'Explain why the emission spectrum of hydrogen contains only specific wavelengths of light.',
-                        'answer': 'According to the Bohr model, electrons in hydrogen atoms can only occupy specific energy levels (quantized energy states). When an electron transitions from a higher energy level to a lower one, it emits a photon with energy equal to the energy difference (E = hf). Since only specific energy level transitions are possible, only specific photon energies (and therefore wavelengths) are emitted, creating the characteristic line spectrum with discrete wavelengths rather than a continuous spectrum.',
-                        'difficulty': 60,
-                        'audio_heavy': True
-                    },
-                    
-                    # Additional Chemistry questions
-                    {
-                        'id': 'ch001',
-                        'subject': 'Chemistry',
-                        'topic': 'Chemical Bonding',
-                        'grade': '11',
-                        'question': 'Explain the difference between ionic and covalent bonding, giving one example of each.',
-                        'answer': 'Ionic bonding occurs when electrons are transferred from one atom to another, creating charged ions that attract electrostatically. Example: NaCl (sodium chloride) - sodium loses an electron to become Na+, chlorine gains an electron to become Cl-. Covalent bonding occurs when atoms share electrons to achieve stable electron configurations. Example: H2O (water) - oxygen shares electrons with two hydrogen atoms, forming polar covalent bonds.',
-                        'difficulty': 20,
-                        'audio_heavy': False
-                    },
-                    
-                    # Mathematics questions
-                    {
-                        'id': 'ma001',
-                        'subject': 'Mathematics',
-                        'topic': 'Calculus',
-                        'grade': '11',
-                        'question': 'Find the derivative of f(x) = 3x² + 5x - 2 using the power rule.',
-                        'answer': 'Using the power rule d/dx(x^n) = nx^(n-1) and the fact that derivatives are linear: f\'(x) = d/dx(3x²) + d/dx(5x) - d/dx(2) = 3(2x¹) + 5(1x⁰) - 0 = 6x + 5. Therefore, f\'(x) = 6x + 5.',
-                        'difficulty': 15,
-                        'audio_heavy': False
-                    },
-                    {
-                        'id': 'ma002',
-                        'subject': 'Mathematics',
-                        'topic': 'Trigonometry',
-                        'grade': '11',
-                        'question': 'Solve the equation sin(2θ) = √3/2 for 0° ≤ θ ≤ 180°.',
-                        'answer': 'First, find when sin(2θ) = √3/2. This occurs when 2θ = 60° or 2θ = 120° (in the range 0° to 360°). Solving for θ: When 2θ = 60°, θ = 30°. When 2θ = 120°, θ = 60°. We also need to consider that sin is positive in both first and second quadrants, so 2θ could also equal 180° - 60° = 120° or 180° - 120° = 60°. However, checking our range 0° ≤ θ ≤ 180°, the solutions are θ = 30° and θ = 60°.',
-                        'difficulty': 35,
-                        'audio_heavy': False
-                    }
-                ]
-                
-                # Insert sample questions
-                for q in sample_questions:
-                    subject_id = subject_map.get(q['subject'])
-                    if subject_id:
-                        # Create topic if it doesn't exist
-                        cursor.execute("""
-                            INSERT OR IGNORE INTO topics (subject_id, name, description) 
-                            VALUES (?, ?, ?)
-                        """, (subject_id, q['topic'], f"{q['topic']} questions for {q['subject']}"))
-                        
-                        # Get topic ID
-                        cursor.execute("""
-                            SELECT id FROM topics WHERE subject_id = ? AND name = ?
-                        """, (subject_id, q['topic']))
-                        topic_id = cursor.fetchone()[0]
-                        
-                        # Insert question
-                        cursor.execute("""
-                            INSERT OR IGNORE INTO question_bank 
-                            (id, subject_id, topic_id, grade, question_text, answer_text, difficulty, audio_heavy)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                        """, (q['id'], subject_id, topic_id, q['grade'], q['question'], 
-                             q['answer'], q['difficulty'], q['audio_heavy']))
-                
-                conn.commit()
-                
-        except Exception as e:
-            print(f"Error adding sample questions: {str(e)}")
+        """Add sample questions from user data (errors propagate to init_database)"""
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            # Get subject IDs
+            cursor.execute("SELECT id, name FROM subjects")
+            subject_map = {name: id for id, name in cursor.fetchall()}
+            
+            # Sample questions data based on user's provided data (only read when seeding)
+            with open(SEED_QUESTIONS_PATH, encoding='utf-8') as f:
+                sample_questions = json.load(f)
+            
+            # Questions whose subject isn't seeded are skipped
+            sample_questions = [q for q in sample_questions if q['subject'] in subject_map]
+            
+            # Topics first, deduplicated in first-seen order, as one batch
+            topic_rows = {
+                (subject_map[q['subject']], q['topic']):
+                    (subject_map[q['subject']], q['topic'], f"{q['topic']} questions for {q['subject']}")
+                for q in sample_questions
+            }
+            cursor.executemany("""
+                INSERT OR IGNORE INTO topics (subject_id, name, description) 
+                VALUES (?, ?, ?)
+            """, list(topic_rows.values()))
+            
+            # One lookup for every topic id instead of one per question
+            cursor.execute("SELECT subject_id, name, id FROM topics")
+            topic_map = {(subject_id, name): topic_id for subject_id, name, topic_id in cursor.fetchall()}
+            
+            question_rows = []
+            for q in sample_questions:
+                subject_id = subject_map[q['subject']]
+                question_rows.append((
+                    q['id'], subject_id, topic_map[(subject_id, q['topic'])], q['grade'],
+                    q['question'], q['answer'], q['difficulty'], q['audio_heavy']
+                ))
+            
+            # Insert sample questions (the question bank indexes are built once at the end)
+            with _deferred_index(conn, 'idx_qbank_subject_grade_diff', 'idx_qb_filter'):
+                cursor.executemany("""
+                    INSERT OR IGNORE INTO question_bank 
+                    (id, subject_id, topic_id, grade, question_text, answer_text, difficulty, audio_heavy)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, question_rows)
+            
+            conn.commit()
+        
+        self.invalidate_caches()
     
     def get_subjects(self) -> List[Dict]:
         """Get all available subjects"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT id, name, description FROM subjects ORDER BY name")
-                return [{'id': row[0], 'name': row[1], 'description': row[2]} for row in cursor.fetchall()]
-        except Exception as e:
-            print(f"Error getting subjects: {str(e)}")
+            return self._subjects()
+        except Exception:
+            logger.exception("Error getting subjects")
             return []
     
     def get_topics_by_subject(self, subject_id: int) -> List[Dict]:
         """Get all topics for a specific subject"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT id, name, description FROM topics 
-                    WHERE subject_id = ? ORDER BY name
-                """, (subject_id,))
-                return [{'id': row[0], 'name': row[1], 'description': row[2]} for row in cursor.fetchall()]
-        except Exception as e:
-            print(f"Error getting topics: {str(e)}")
+            return self._topics_by_subject(subject_id)
+        except Exception:
+            logger.exception("Error getting topics")
             return []
     
     def get_grades_by_subject(self, subject_id: int) -> List[str]:
         """Get available grades for a specific subject"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT DISTINCT grade FROM question_bank 
-                    WHERE subject_id = ? ORDER BY grade
-                """, (subject_id,))
-                return [row[0] for row in cursor.fetchall()]
-        except Exception as e:
-            print(f"Error getting grades: {str(e)}")
+            return self._grades_by_subject(subject_id)
+        except Exception:
+            logger.exception("Error getting grades")
             return []
     
+    # Reference data only changes when the question bank is seeded, so these queries are
+    # memoized per instance in __init__ (failures raise and are not cached); callers treat
+    # the lists as read-only
+    def _load_subjects(self) -> List[Dict]:
+        with self._read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, name, description FROM subjects ORDER BY name")
+            return list(map(dict, cursor.fetchall()))
+    
+    def _load_topics_by_subject(self, subject_id: int) -> List[Dict]:
+        with self._read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, name, description FROM topics 
+                WHERE subject_id = ? ORDER BY name
+            """, (subject_id,))
+            return list(map(dict, cursor.fetchall()))
+    
+    def _load_grades_by_subject(self, subject_id: int) -> List[str]:
+        with self._read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT DISTINCT grade FROM question_bank 
+                WHERE subject_id = ? ORDER BY grade
+            """, (subject_id,))
+            return [row[0] for row in cursor.fetchall()]
+    
+    def invalidate_caches(self):
+        """Forget memoized subjects, topics and grades (call after changing the question bank)"""
+        self._subjects.cache_clear()
+        self._topics_by_subject.cache_clear()
+        self._grades_by_subject.cache_clear()
+    
     def get_predefined_questions(self, subject_id: int = None, topic_id: int = None, 
                                grade: str = None, difficulty_min: float = 1.0, 
                                difficulty_max: float = 100.0, limit: int = None) -> List[Dict]:
         """Get predefined questions based on filters"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._read_connection() as conn:
                 cursor = conn.cursor()
                 
                 query = """
                     SELECT qb.id, s.name as subject, t.name as topic, qb.grade,
-                           qb.question_text, qb.answer_text, qb.difficulty, qb.audio_heavy
+                           qb.question_text AS question, qb.answer_text AS answer,
+                           qb.difficulty, qb.audio_heavy,
+                           CASE WHEN qb.difficulty <= 30 THEN 'Easy'
+                                WHEN qb.difficulty <= 60 THEN 'Moderate'
+                                ELSE 'Difficult' END AS level
                     FROM question_bank qb
                     JOIN subjects s ON qb.subject_id = s.id
                     LEFT JOIN topics t ON qb.topic_id = t.id
@@ -846,46 +1137,45 @@ class DatabaseManager:
                 
                 query += " ORDER BY qb.difficulty, qb.id"
                 
+                # Bound, not interpolated: one statement text (and cached plan) for every limit
                 if limit:
-                    query += f" LIMIT {limit}"
+                    query += " LIMIT ?"
+                    params.append(int(limit))
                 
                 cursor.execute(query, params)
                 
-                questions = []
-                for row in cursor.fetchall():
-                    questions.append({
-                        'id': row[0],
-                        'subject': row[1],
-                        'topic': row[2],
-                        'grade': row[3],
-                        'question': row[4],
-                        'answer': row[5],
-                        'difficulty': row[6],
-                        'audio_heavy': row[7],
-                        'level': self._get_difficulty_level(row[6])
-                    })
-                
-                return questions
+                # level is derived in the SELECT (same thresholds as _get_difficulty_level)
+                return list(map(dict, cursor))
                 
-        except Exception as e:
-            print(f"Error getting predefined questions: {str(e)}")
+        except Exception:
+            logger.exception("Error getting predefined questions")
+            return []
+    
+    @_with_cursor("Error searching questions", default=list, readonly=True)
+    def search_questions(self, cursor, query: str, limit: int = 50) -> List[Dict]:
+        """Full-text search over question and answer text for all of the query's words, best matches first"""
+        # Each word is matched as a quoted FTS5 string, so quotes, dashes and operators in user
+        # input are searched for literally instead of failing as query syntax
+        terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+        if not terms:
             return []
+        cursor.execute(_SQL_SEARCH_QUESTIONS, (" ".join(terms), int(limit)))
+        return list(map(dict, cursor))
     
     def _get_difficulty_level(self, difficulty: float) -> str:
         """Convert numeric difficulty to text level"""
-        if difficulty <= 30:
-            return "Easy"
-        elif difficulty <= 60:
-            return "Moderate"
-        else:
-            return "Difficult"
+        # NaN fails every `<=` threshold (Difficult), and ceil() can't take it or the infinities
+        if not math.isfinite(difficulty):
+            return _DIFF_LEVELS[0] if difficulty < 0 else _DIFF_LEVELS[-1]
+        # ceil keeps fractional values on the same side of each threshold as `<=` did
+        return _DIFF_LEVELS[min(100, max(0, math.ceil(difficulty)))]
     
     def create_predefined_question_session(self, user_id: int, name: str, grade: str,
                                          subject_id: int, topic_id: int = None,
                                          difficulty_min: float = 1.0, difficulty_max: float = 100.0) -> int:
         """Create a new session for predefined questions"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connection() as conn:
                 cursor = conn.cursor()
                 
                 cursor.execute("""
@@ -896,9 +1186,9 @@ class DatabaseManager:
                 
                 session_id = cursor.lastrowid
                 
-                # Count available questions for this session
+                # Count available questions for this session (from the trigger-maintained counters)
                 question_count_query = """
-                    SELECT COUNT(*) FROM question_bank 
+                    SELECT COALESCE(SUM(cnt), 0) FROM question_counts 
                     WHERE subject_id = ? AND difficulty BETWEEN ? AND ?
                 """
                 params = [subject_id, difficulty_min, difficulty_max]
@@ -908,7 +1198,7 @@ class DatabaseManager:
                     params.append(grade)
                 
                 if topic_id:
-                    question_count_query += " AND topic_id = ?"
+                    question_count_query += " AND topic_key = ?"
                     params.append(topic_id)
                 
                 cursor.execute(question_count_query, params)
@@ -925,56 +1215,150 @@ class DatabaseManager:
                 return session_id
                 
         except Exception as e:
-            print(f"Error creating predefined question session: {str(e)}")
+            logger.exception("Error creating predefined question session")
             raise Exception(f"Error creating session: {str(e)}")
     
     def save_predefined_question_answer(self, session_id: int, question_id: str, 
                                       user_answer: str, score: int, 
                                       time_taken: int = None, answer_method: str = 'text') -> bool:
-        """Save a user's answer to a predefined question"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Insert or update answer
-                cursor.execute("""
-                    INSERT OR REPLACE INTO predefined_question_answers 
-                    (session_id, question_id, user_answer, score, time_taken, answer_method)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (session_id, question_id, user_answer, score, time_taken, answer_method))
-                
-                # Update session progress
-                cursor.execute("""
-                    SELECT COUNT(*), SUM(score) FROM predefined_question_answers 
-                    WHERE session_id = ?
-                """, (session_id,))
-                
-                answered, total_score = cursor.fetchone()
-                answered = answered or 0
-                total_score = total_score or 0
-                
-                cursor.execute("""
-                    UPDATE predefined_question_sessions 
-                    SET questions_answered = ?, total_score = ?
-                    WHERE id = ?
-                """, (answered, total_score, session_id))
-                
-                conn.commit()
+        """
+        Queue a user's answer to a predefined question (written by the background writer)
+        
+        The answer is always queued. Returns False while queued answers are failing to write
+        (they are kept and retried), so the caller can tell the user their save is delayed.
+        """
+        self._pending_answers.append((session_id, question_id, user_answer, score, time_taken, answer_method))
+        if len(self._pending_answers) >= ANSWER_FLUSH_BATCH:
+            self._answers_ready.set()
+        return not self._answers_failing
+    
+    def flush_answers(self) -> bool:
+        """
+        Write every queued predefined-question answer and its session progress in one transaction
+        
+        A batch that fails to write goes back to the front of the queue for the next flush, and
+        answer metrics are only recorded once their answers are stored. Returns False on failure.
+        """
+        with self._answers_lock:
+            batch = []
+            while self._pending_answers:
+                batch.append(self._pending_answers.popleft())
+            if not batch:
                 return True
-                
-        except Exception as e:
-            print(f"Error saving predefined question answer: {str(e)}")
-            return False
+            try:
+                with self._connection() as conn:
+                    cursor = conn.cursor()
+                    # Previous scores are read under the write lock (other processes may share the file)
+                    _begin_immediate(conn)
+                    deltas = {}
+                    for session_id, question_id, user_answer, score, time_taken, answer_method in batch:
+                        # Previous answer (primary-key lookup), then insert or update in place
+                        cursor.execute("""
+                            SELECT score FROM predefined_question_answers
+                            WHERE session_id = ? AND question_id = ?
+                        """, (session_id, question_id))
+                        previous = cursor.fetchone()
+                        
+                        cursor.execute("""
+                            INSERT INTO predefined_question_answers 
+                            (session_id, question_id, user_answer, score, time_taken, answer_method)
+                            VALUES (?, ?, ?, ?, ?, ?)
+                            ON CONFLICT(session_id, question_id) DO UPDATE SET
+                                user_answer = excluded.user_answer, score = excluded.score,
+                                time_taken = excluded.time_taken, answer_method = excluded.answer_method,
+                                answered_at = CURRENT_TIMESTAMP
+                        """, (session_id, question_id, user_answer, score, time_taken, answer_method))
+                        
+                        answered, total = deltas.get(session_id, (0, 0))
+                        if previous:
+                            deltas[session_id] = (answered, total + (score or 0) - (previous[0] or 0))
+                        else:
+                            deltas[session_id] = (answered + 1, total + (score or 0))
+                    
+                    # Session progress moves by the batch's delta, one UPDATE per session
+                    cursor.executemany("""
+                        UPDATE predefined_question_sessions 
+                        SET questions_answered = questions_answered + ?, total_score = total_score + ?
+                        WHERE id = ?
+                    """, [(answered, total, session_id) for session_id, (answered, total) in deltas.items()])
+            except Exception:
+                logger.exception("Error saving predefined question answers (%d queued for retry)", len(batch))
+                self._pending_answers.extendleft(reversed(batch))
+                self._answers_failing = True
+                return False
+            
+            self._answers_failing = False
+            
+            for session_id, _, _, score, time_taken, _ in batch:
+                self._record_metric(session_id, score, time_taken)
+            return True
+    
+    def _record_metric(self, session_id: int, score: Optional[int], time_taken: Optional[int]):
+        """Buffer one answer's score and time, appending the session's batch once it is full"""
+        with self._metrics_lock:
+            pending = self._pending_metrics.setdefault(session_id, [])
+            pending.append((METRIC_MISSING if score is None else score,
+                            METRIC_MISSING if time_taken is None else time_taken))
+            if len(pending) >= METRICS_FLUSH_ANSWERS:
+                self._write_metrics({session_id: self._pending_metrics.pop(session_id)})
+    
+    def flush_metrics(self):
+        """Append every buffered answer metric to predefined_question_metrics"""
+        with self._metrics_lock:
+            if self._pending_metrics:
+                self._write_metrics(self._pending_metrics)
+                self._pending_metrics = {}
+    
+    def _write_metrics(self, batch: Dict[int, List[Tuple[int, int]]]):
+        # Caller holds _metrics_lock, so batches for a session are appended in order
+        rows = []
+        for session_id, values in batch.items():
+            packed = np.clip(np.array(values, dtype=np.int64), METRIC_MISSING, np.iinfo(np.int16).max).astype(np.int16)
+            rows.append((session_id, packed[:, 0].tobytes(), packed[:, 1].tobytes()))
+        try:
+            with self._connection() as conn:
+                # || on BLOBs yields TEXT with the same bytes; the CAST keeps the column a BLOB
+                conn.executemany("""
+                    INSERT INTO predefined_question_metrics (session_id, scores, times)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(session_id) DO UPDATE SET
+                        scores = CAST(scores || excluded.scores AS BLOB),
+                        times = CAST(times || excluded.times AS BLOB)
+                """, rows)
+        except Exception:
+            logger.exception("Error saving answer metrics")
+    
+    def get_session_metrics(self, session_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Scores and times of every answer saved in a session, as int16 vectors (-1 where missing)"""
+        self.flush_answers()
+        self.flush_metrics()
+        try:
+            with self._read_connection() as conn:
+                row = conn.execute("""
+                    SELECT scores, times FROM predefined_question_metrics WHERE session_id = ?
+                """, (session_id,)).fetchone()
+        except Exception:
+            logger.exception("Error getting session metrics")
+            row = None
+        if row is None:
+            return np.empty(0, dtype=np.int16), np.empty(0, dtype=np.int16)
+        return np.frombuffer(row[0], dtype=np.int16), np.frombuffer(row[1], dtype=np.int16)
     
     def get_predefined_session_questions(self, session_id: int) -> Tuple[Dict, List[Dict]]:
         """Get session info and its questions with user answers"""
+        self.flush_answers()
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._read_connection() as conn:
                 cursor = conn.cursor()
                 
                 # Get session info
                 cursor.execute("""
-                    SELECT pqs.*, s.name as subject_name, t.name as topic_name
+                    SELECT pqs.id, pqs.user_id, pqs.name, pqs.grade, pqs.subject_id, pqs.topic_id,
+                           pqs.difficulty_range_min AS difficulty_min,
+                           pqs.difficulty_range_max AS difficulty_max,
+                           pqs.total_questions, pqs.questions_answered, pqs.total_score,
+                           pqs.max_possible_score, pqs.status, pqs.created_at, pqs.completed_at,
+                           s.name as subject_name, t.name as topic_name
                     FROM predefined_question_sessions pqs
                     JOIN subjects s ON pqs.subject_id = s.id
                     LEFT JOIN topics t ON pqs.topic_id = t.id
@@ -985,25 +1369,7 @@ class DatabaseManager:
                 if not session_row:
                     return None, []
                 
-                session_info = {
-                    'id': session_row[0],
-                    'user_id': session_row[1],
-                    'name': session_row[2],
-                    'grade': session_row[3],
-                    'subject_id': session_row[4],
-                    'topic_id': session_row[5],
-                    'difficulty_min': session_row[6],
-                    'difficulty_max': session_row[7],
-                    'total_questions': session_row[8],
-                    'questions_answered': session_row[9],
-                    'total_score': session_row[10],
-                    'max_possible_score': session_row[11],
-                    'status': session_row[12],
-                    'created_at': session_row[13],
-                    'completed_at': session_row[14],
-                    'subject_name': session_row[15],
-                    'topic_name': session_row[16]
-                }
+                session_info = dict(session_row)
                 
                 # Get questions with user answers
                 questions = self.get_predefined_questions(
@@ -1014,15 +1380,16 @@ class DatabaseManager:
                     difficulty_max=session_info['difficulty_max']
                 )
                 
-                # Add user answer info
+                # Add user answer info (all of the session's answers in one primary-key range read)
+                cursor.execute("""
+                    SELECT question_id, user_answer, score, answered_at, answer_method
+                    FROM predefined_question_answers
+                    WHERE session_id = ?
+                """, (session_id,))
+                answers = {row[0]: row[1:] for row in cursor}
+                
                 for question in questions:
-                    cursor.execute("""
-                        SELECT user_answer, score, answered_at, answer_method
-                        FROM predefined_question_answers
-                        WHERE session_id = ? AND question_id = ?
-                    """, (session_id, question['id']))
-                    
-                    answer_row = cursor.fetchone()
+                    answer_row = answers.get(question['id'])
                     if answer_row:
                         question['user_answer'] = answer_row[0]
                         question['score'] = answer_row[1]
@@ -1036,50 +1403,46 @@ class DatabaseManager:
                 
                 return session_info, questions
                 
-        except Exception as e:
-            print(f"Error getting predefined session questions: {str(e)}")
+        except Exception:
+            logger.exception("Error getting predefined session questions")
             return None, []
     
-    def get_user_predefined_sessions(self, user_id: int) -> List[Dict]:
+    @_with_cursor("Error getting user predefined sessions", default=list, readonly=True)
+    def get_user_predefined_sessions(self, cursor, user_id: int) -> List[Dict]:
         """Get all predefined question sessions for a user"""
+        self.flush_answers()
+        cursor.execute("""
+            SELECT pqs.id, pqs.name, pqs.grade, s.name as subject, 
+                   t.name as topic, pqs.total_questions, pqs.questions_answered,
+                   pqs.total_score, pqs.max_possible_score, pqs.status,
+                   pqs.created_at, pqs.completed_at
+            FROM predefined_question_sessions pqs
+            JOIN subjects s ON pqs.subject_id = s.id
+            LEFT JOIN topics t ON pqs.topic_id = t.id
+            WHERE pqs.user_id = ?
+            ORDER BY pqs.created_at DESC
+        """, (user_id,))
+        
+        return list(map(dict, cursor))
+
+def build_seed_database(path: Path = SEED_DB_PATH):
+    """Write a freshly initialized and seeded database to path as a single rollback-journal file"""
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = DatabaseManager(os.path.join(tmp, "seed.db"), pool_size=1, use_seed=False)
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                cursor.execute("""
-                    SELECT pqs.id, pqs.name, pqs.grade, s.name as subject_name, 
-                           t.name as topic_name, pqs.total_questions, pqs.questions_answered,
-                           pqs.total_score, pqs.max_possible_score, pqs.status,
-                           pqs.created_at, pqs.completed_at
-                    FROM predefined_question_sessions pqs
-                    JOIN subjects s ON pqs.subject_id = s.id
-                    LEFT JOIN topics t ON pqs.topic_id = t.id
-                    WHERE pqs.user_id = ?
-                    ORDER BY pqs.created_at DESC
-                """, (user_id,))
-                
-                sessions = []
-                for row in cursor.fetchall():
-                    sessions.append({
-                        'id': row[0],
-                        'name': row[1],
-                        'grade': row[2],
-                        'subject': row[3],
-                        'topic': row[4],
-                        'total_questions': row[5],
-                        'questions_answered': row[6],
-                        'total_score': row[7],
-                        'max_possible_score': row[8],
-                        'status': row[9],
-                        'created_at': row[10],
-                        'completed_at': row[11]
-                    })
-                
-                return sessions
-                
-        except Exception as e:
-            print(f"Error getting user predefined sessions: {str(e)}")
-            return []
+            with manager._connection() as src:
+                dst = sqlite3.connect(path)
+                src.backup(dst)
+                dst.execute("PRAGMA journal_mode = DELETE")
+                dst.execute("VACUUM")
+                dst.execute(_SQL_REBUILD_QUESTION_FTS)
+                dst.commit()
+                dst.close()
+        finally:
+            manager.close()
 
-# Global database instance
-db_manager = DatabaseManager()
+if __name__ == "__main__":
+    build_seed_database()
+else:
+    # Global database instance
+    db_manager = DatabaseManager()
@@ -11,7 +11,7 @@ import numpy as np
 import scipy.io.wavfile as wav
 import speech_recognition as sr
 import time
-from   auth import auth_manager
+from   auth import get_auth_manager
 from   database import db_manager
 from openai import OpenAI as OpenAIClient  # Renamed to avoid conflict
 
@@ -34,6 +34,7 @@ llm = ChatOpenAI(
 tts_client = OpenAIClient(api_key=openai_api_key)
 
 # ------------------ Authentication Check ------------------
+auth_manager = get_auth_manager()
 auth_manager.require_authentication()
 
 # Show user profile in sidebar
@@ -262,6 +263,7 @@ if st.session_state.question_mode == "PDF Upload":
                     pdf_content=pdf_content
                 )
                 st.session_state.current_conversation_id = conversation_id
+                auth_manager.invalidate_dashboard()
                 st.success(f"📚 Study session created and saved!")
             except Exception as e:
                 st.error(f"Error creating study session: {str(e)}")
@@ -378,6 +380,7 @@ A16: ...
             # Save questions to database
             if st.session_state.current_conversation_id:
                 success = db_manager.save_questions(st.session_state.current_conversation_id, all_qas)
+                auth_manager.invalidate_dashboard()
                 if success:
                     st.success("✅ Viva questions generated and saved to database.")
                 else:
@@ -420,6 +423,7 @@ elif st.session_state.question_mode == "Predefined Questions":
                 )
                 
                 st.session_state.current_predefined_session_id = session_id
+                auth_manager.invalidate_dashboard()
                 
                 # Load questions for the session
                 session_info, questions = db_manager.get_predefined_session_questions(session_id)
@@ -869,19 +873,23 @@ if st.session_state.all_qas:
                             questions = db_manager.get_conversation_questions(st.session_state.current_conversation_id)
                             if current < len(questions):
                                 question_id = questions[current]['id']
-                                db_manager.save_user_answer(question_id, text, score, answer_method='speech_training')
+                                db_manager.save_user_answer(question_id, text, score, answer_method='speech_training',
+                                                            conversation_id=st.session_state.current_conversation_id)
                                 db_manager.update_user_progress(current_user['id'], subject)
+                                auth_manager.invalidate_dashboard()
                         elif st.session_state.current_predefined_session_id:
                             question_id = qa.get('id')
                             if question_id:
-                                db_manager.save_predefined_question_answer(
+                                if not db_manager.save_predefined_question_answer(
                                     st.session_state.current_predefined_session_id,
                                     question_id,
                                     text,
                                     score,
                                     answer_method='speech_training'
-                                )
+                                ):
+                                    st.warning("⚠️ Answer kept, but the database isn't accepting writes right now; it will be saved once it recovers.")
                                 db_manager.update_user_progress(current_user['id'], subject)
+                                auth_manager.invalidate_dashboard()
                         
                         # Add to used indices
                         if current not in st.session_state.used_q_indices:
@@ -936,19 +944,23 @@ if st.session_state.all_qas:
                     questions = db_manager.get_conversation_questions(st.session_state.current_conversation_id)
                     if current < len(questions):
                         question_id = questions[current]['id']
-                        db_manager.save_user_answer(question_id, backup_answer, score, answer_method='selective_mutism_text')
+                        db_manager.save_user_answer(question_id, backup_answer, score, answer_method='selective_mutism_text',
+                                                    conversation_id=st.session_state.current_conversation_id)
                         db_manager.update_user_progress(current_user['id'], subject)
+                        auth_manager.invalidate_dashboard()
                 elif st.session_state.current_predefined_session_id:
                     question_id = qa.get('id')
                     if question_id:
-                        db_manager.save_predefined_question_answer(
+                        if not db_manager.save_predefined_question_answer(
                             st.session_state.current_predefined_session_id,
                             question_id,
                             backup_answer,
                             score,
                             answer_method='selective_mutism_text'
-                        )
+                        ):
+                            st.warning("⚠️ Answer kept, but the database isn't accepting writes right now; it will be saved once it recovers.")
                         db_manager.update_user_progress(current_user['id'], subject)
+                        auth_manager.invalidate_dashboard()
                 
                 if current not in st.session_state.used_q_indices:
                     st.session_state.used_q_indices.append(current)
@@ -1007,20 +1019,24 @@ if st.session_state.all_qas:
                             questions = db_manager.get_conversation_questions(st.session_state.current_conversation_id)
                             if current < len(questions):
                                 question_id = questions[current]['id']
-                                db_manager.save_user_answer(question_id, text, score, answer_method='audio')
+                                db_manager.save_user_answer(question_id, text, score, answer_method='audio',
+                                                            conversation_id=st.session_state.current_conversation_id)
                                 db_manager.update_user_progress(current_user['id'], subject)
+                                auth_manager.invalidate_dashboard()
                         elif st.session_state.current_predefined_session_id:
                             # Predefined questions
                             question_id = qa.get('id')
                             if question_id:
-                                db_manager.save_predefined_question_answer(
+                                if not db_manager.save_predefined_question_answer(
                                     st.session_state.current_predefined_session_id,
                                     question_id,
                                     text,
                                     score,
                                     answer_method='audio'
-                                )
+                                ):
+                                    st.warning("⚠️ Answer kept, but the database isn't accepting writes right now; it will be saved once it recovers.")
                                 db_manager.update_user_progress(current_user['id'], subject)
+                                auth_manager.invalidate_dashboard()
                         
                         # Add to used indices
                         if current not in st.session_state.used_q_indices:
@@ -1059,24 +1075,28 @@ if st.session_state.all_qas:
                 questions = db_manager.get_conversation_questions(st.session_state.current_conversation_id)
                 if current < len(questions):
                     question_id = questions[current]['id']
-                    db_manager.save_user_answer(question_id, manual_answer, score, answer_method='text')
+                    db_manager.save_user_answer(question_id, manual_answer, score, answer_method='text',
+                                                conversation_id=st.session_state.current_conversation_id)
                     
                     # Update user progress
                     db_manager.update_user_progress(current_user['id'], subject)
+                    auth_manager.invalidate_dashboard()
             elif st.session_state.current_predefined_session_id:
                 # Predefined questions
                 question_id = qa.get('id')  # Use the question ID from predefined bank
                 if question_id:
-                    db_manager.save_predefined_question_answer(
+                    if not db_manager.save_predefined_question_answer(
                         st.session_state.current_predefined_session_id, 
                         question_id, 
                         manual_answer, 
                         score, 
                         answer_method='text'
-                    )
+                    ):
+                        st.warning("⚠️ Answer kept, but the database isn't accepting writes right now; it will be saved once it recovers.")
                     
                     # Update user progress
                     db_manager.update_user_progress(current_user['id'], subject)
+                    auth_manager.invalidate_dashboard()
             
             # Only add to used indices if not already added
             if current not in st.session_state.used_q_indices:
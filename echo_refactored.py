@@ -10,7 +10,7 @@ from langchain_openai import OpenAI
 from dotenv import load_dotenv
 import os
 import time
-from auth import auth_manager
+from auth import get_auth_manager
 from database import db_manager
 
 # Import our new modules
@@ -42,6 +42,7 @@ adaptive_engine = AdaptiveLearningEngine()
 selective_mutism_support = SelectiveMutismSupport()
 
 # ------------------ Authentication Check ------------------
+auth_manager = get_auth_manager()
 auth_manager.require_authentication()
 
 # Show user profile in sidebar
@@ -305,6 +306,7 @@ def handle_pdf_upload(name, grade, subject, book_title):
                     pdf_content=pdf_content
                 )
                 st.session_state.current_conversation_id = conversation_id
+                auth_manager.invalidate_dashboard()
                 st.success(f"📚 Study session created and saved!")
             except Exception as e:
                 st.error(f"Error creating study session: {str(e)}")
@@ -335,6 +337,7 @@ def handle_pdf_upload(name, grade, subject, book_title):
                 # Save questions to database
                 if st.session_state.current_conversation_id:
                     success = db_manager.save_questions(st.session_state.current_conversation_id, questions)
+                    auth_manager.invalidate_dashboard()
                     if success:
                         st.success("✅ Viva questions generated and saved to database.")
                     else:
@@ -388,6 +391,7 @@ def handle_predefined_questions(name, grade, subject, book_title, predefined_var
                 )
                 
                 st.session_state.current_predefined_session_id = session_id
+                auth_manager.invalidate_dashboard()
                 
                 # Load questions for the session
                 session_info, questions = db_manager.get_predefined_session_questions(session_id)
@@ -617,21 +621,25 @@ def save_answer_to_database(current, answer_text, score, method, subject):
             questions = db_manager.get_conversation_questions(st.session_state.current_conversation_id)
             if current < len(questions):
                 question_id = questions[current]['id']
-                db_manager.save_user_answer(question_id, answer_text, score, answer_method=method)
+                db_manager.save_user_answer(question_id, answer_text, score, answer_method=method,
+                                            conversation_id=st.session_state.current_conversation_id)
                 db_manager.update_user_progress(current_user['id'], subject)
+                auth_manager.invalidate_dashboard()
         elif st.session_state.current_predefined_session_id:
             # Predefined questions
             qa = st.session_state.all_qas[current]
             question_id = qa.get('id')
             if question_id:
-                db_manager.save_predefined_question_answer(
+                if not db_manager.save_predefined_question_answer(
                     st.session_state.current_predefined_session_id,
                     question_id,
                     answer_text,
                     score,
                     answer_method=method
-                )
+                ):
+                    st.warning("⚠️ Answer kept, but the database isn't accepting writes right now; it will be saved once it recovers.")
                 db_manager.update_user_progress(current_user['id'], subject)
+                auth_manager.invalidate_dashboard()
     except Exception as e:
         st.error(f"Error saving answer: {str(e)}")
 